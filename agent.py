@@ -1,90 +1,218 @@
-import requests
+import httpx
 import json
-from typing import Dict, List, Any
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for_futures
+from typing import Dict, List, Any, Optional, AsyncIterator, TYPE_CHECKING
 from config import Config
+from cache import ToolResultCache, get_tool_cache
+from http_client import create_session, create_async_client, request_with_retry, request_with_retry_async
+from metrics import span, record_usage, TOOL_CALLS, CONTEXT_TOKENS_SAVED
+from context_trim import trim_tool_results
+from rate_limiter import GroqRateLimiter, get_rate_limiter
+from llm_router import LLMRouter, endpoints_from_config, get_llm_router
+
+if TYPE_CHECKING:
+    import requests
+
+
+SYSTEM_PROMPT = """You are a helpful AI agent that creates detailed, actionable plans from natural language goals.
+
+When creating plans, you should:
+1. Break down the goal into clear, day-by-day steps
+2. Use web search to gather current information about places, activities, restaurants, etc.
+3. Use weather information when relevant to the plan
+4. Structure the output as a clear, organized plan with specific times and locations
+5. Include practical details like costs, booking requirements, transportation, etc.
+
+Always use the available tools to gather external information to make your plans more accurate and helpful."""
+
 
 class TaskPlanningAgent:
-    def __init__(self, debug_mode=False):
-        self.groq_api_key = Config.GROQ_API_KEY
-        self.model = Config.GROQ_MODEL
-        self.base_url = "https://api.groq.com/openai/v1"
+    def __init__(self, debug_mode=False, tool_cache: Optional[ToolResultCache] = None, rate_limiter: Optional[GroqRateLimiter] = None,
+                 router: Optional[LLMRouter] = None):
+        self.search_url = Config.SEARCH_API_URL
+        self.weather_url = Config.WEATHER_API_URL
         self.debug_mode = debug_mode
-        
+        self.tool_call_timeout = Config.TOOL_CALL_TIMEOUT
+        self.max_concurrent_tool_calls = max(1, Config.MAX_CONCURRENT_TOOL_CALLS)
+        self.tool_cache = tool_cache or get_tool_cache()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # Chooses, hedges and fails over between the configured LLM endpoints
+        self.router = router or (LLMRouter(endpoints_from_config(rate_limiter)) if rate_limiter else get_llm_router())
+        # One pooled keep-alive client per upstream host ("groq", "search", "weather", other LLM endpoints)
+        self._sessions: Dict[str, "requests.Session"] = {}
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._tool_executor: Optional[ThreadPoolExecutor] = None
+        # Tool schemas, system prompt and request JSON prefixes never change, so build them once
+        self.tools = self._build_tools()
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        self._tool_request_prefix = self._request_prefix(tools=self.tools, tool_choice="auto")
+        self._final_request_prefix = self._request_prefix()
+
+    def _get_session(self, upstream: str) -> "requests.Session":
+        """Return the pooled session for an upstream, creating it on first use"""
+        session = self._sessions.get(upstream)
+        if session is None:
+            session = self._sessions[upstream] = create_session()
+        return session
+
+    def _get_async_client(self, upstream: str) -> httpx.AsyncClient:
+        """Return the pooled async client for an upstream, creating it on first use"""
+        client = self._async_clients.get(upstream)
+        if client is None or client.is_closed:
+            client = self._async_clients[upstream] = create_async_client()
+        return client
+
+    def close(self):
+        """Close pooled sessions and the tool thread pool"""
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        if self._tool_executor is not None:
+            self._tool_executor.shutdown(wait=False)
+            self._tool_executor = None
+
+    async def aclose(self):
+        """Close every pooled client, sync and async"""
+        for client in self._async_clients.values():
+            if not client.is_closed:
+                await client.aclose()
+        self._async_clients.clear()
+        self.close()
+
+    def _search_params(self, query: str) -> Dict[str, str]:
+        return {
+            'q': query,
+            'format': 'json',
+            'no_html': '1',
+            'skip_disambig': '1'
+        }
+
+    def _parse_search_results(self, data: Dict[str, Any], query: str, num_results: int) -> str:
+        """Turn a DuckDuckGo instant answer payload into plain text"""
+        results = []
+
+        # Get abstract if available
+        if data.get('Abstract'):
+            results.append(f"Summary: {data['Abstract']}")
+
+        # Get related topics
+        if data.get('RelatedTopics'):
+            for topic in data['RelatedTopics'][:num_results]:
+                if isinstance(topic, dict) and 'Text' in topic:
+                    results.append(topic['Text'])
+
+        # Get instant answer if available
+        if data.get('Answer'):
+            results.append(f"Answer: {data['Answer']}")
+
+        return "\n".join(results) if results else f"No specific information found for: {query}"
+
+    def _weather_params(self, location: str) -> Dict[str, str]:
+        return {
+            'q': location,
+            'appid': Config.OPENWEATHER_API_KEY,
+            'units': 'metric'
+        }
+
+    def _format_weather(self, data: Dict[str, Any]) -> str:
+        """Turn an OpenWeather payload into a one-line summary"""
+        weather_info = {
+            'location': data['name'],
+            'country': data['sys']['country'],
+            'temperature': data['main']['temp'],
+            'description': data['weather'][0]['description'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed']
+        }
+
+        return f"Weather in {weather_info['location']}, {weather_info['country']}: {weather_info['temperature']}°C, {weather_info['description']}, Humidity: {weather_info['humidity']}%, Wind: {weather_info['wind_speed']} m/s"
+
     def web_search(self, query: str, num_results: int = 5) -> str:
         """Perform web search using DuckDuckGo instant answer API"""
+        cache_key = self.tool_cache.make_key("web_search", query=query, num_results=num_results)
+        cached = self.tool_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             # Using DuckDuckGo instant answer API (no API key required)
-            url = "https://api.duckduckgo.com/"
-            params = {
-                'q': query,
-                'format': 'json',
-                'no_html': '1',
-                'skip_disambig': '1'
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            # Extract relevant information
-            results = []
-            
-            # Get abstract if available
-            if data.get('Abstract'):
-                results.append(f"Summary: {data['Abstract']}")
-            
-            # Get related topics
-            if data.get('RelatedTopics'):
-                for topic in data['RelatedTopics'][:num_results]:
-                    if isinstance(topic, dict) and 'Text' in topic:
-                        results.append(topic['Text'])
-            
-            # Get instant answer if available
-            if data.get('Answer'):
-                results.append(f"Answer: {data['Answer']}")
-                
-            return "\n".join(results) if results else f"No specific information found for: {query}"
-            
+            response = request_with_retry(self._get_session("search"), "GET", self.search_url, params=self._search_params(query))
+            result = self._parse_search_results(response.json(), query, num_results)
+
         except Exception as e:
             return f"Search error: {str(e)}"
-    
+
+        self.tool_cache.set(cache_key, result, Config.SEARCH_CACHE_TTL)
+        return result
+
+    async def web_search_async(self, query: str, num_results: int = 5, refresh: bool = False) -> str:
+        """Non-blocking variant of web_search; refresh skips the cached result and replaces it"""
+        cache_key = self.tool_cache.make_key("web_search", query=query, num_results=num_results)
+        cached = None if refresh else await self.tool_cache.get_async(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await request_with_retry_async(self._get_async_client("search"), "GET", self.search_url, params=self._search_params(query))
+            result = self._parse_search_results(response.json(), query, num_results)
+
+        except Exception as e:
+            return f"Search error: {str(e)}"
+
+        await self.tool_cache.set_async(cache_key, result, Config.SEARCH_CACHE_TTL)
+        return result
+
     def get_weather(self, location: str) -> str:
         """Get weather information for a location"""
+        if not Config.OPENWEATHER_API_KEY:
+            return "Weather API key not configured"
+
+        cache_key = self.tool_cache.make_key("get_weather", location=location)
+        cached = self.tool_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            if not Config.OPENWEATHER_API_KEY:
-                return "Weather API key not configured"
-                
-            url = "http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'q': location,
-                'appid': Config.OPENWEATHER_API_KEY,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if response.status_code == 200:
-                weather_info = {
-                    'location': data['name'],
-                    'country': data['sys']['country'],
-                    'temperature': data['main']['temp'],
-                    'description': data['weather'][0]['description'],
-                    'humidity': data['main']['humidity'],
-                    'wind_speed': data['wind']['speed']
-                }
-                
-                return f"Weather in {weather_info['location']}, {weather_info['country']}: {weather_info['temperature']}°C, {weather_info['description']}, Humidity: {weather_info['humidity']}%, Wind: {weather_info['wind_speed']} m/s"
-            else:
+            response = request_with_retry(self._get_session("weather"), "GET", self.weather_url, params=self._weather_params(location))
+
+            if response.status_code != 200:
                 return f"Weather data not available for {location}"
-                
+            result = self._format_weather(response.json())
+
         except Exception as e:
             return f"Weather error: {str(e)}"
-    
-    def create_plan(self, goal: str) -> Dict[str, Any]:
-        """Create a detailed plan using LLM with tool calling"""
-        
-        # Define available tools
-        tools = [
+
+        self.tool_cache.set(cache_key, result, Config.WEATHER_CACHE_TTL)
+        return result
+
+    async def get_weather_async(self, location: str, refresh: bool = False) -> str:
+        """Non-blocking variant of get_weather; refresh skips the cached result and replaces it"""
+        if not Config.OPENWEATHER_API_KEY:
+            return "Weather API key not configured"
+
+        cache_key = self.tool_cache.make_key("get_weather", location=location)
+        cached = None if refresh else await self.tool_cache.get_async(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await request_with_retry_async(self._get_async_client("weather"), "GET", self.weather_url, params=self._weather_params(location))
+
+            if response.status_code != 200:
+                return f"Weather data not available for {location}"
+            result = self._format_weather(response.json())
+
+        except Exception as e:
+            return f"Weather error: {str(e)}"
+
+        await self.tool_cache.set_async(cache_key, result, Config.WEATHER_CACHE_TTL)
+        return result
+
+    def _build_tools(self) -> List[Dict[str, Any]]:
+        """Tool schemas advertised to the LLM"""
+        return [
             {
                 "type": "function",
                 "function": {
@@ -125,132 +253,456 @@ class TaskPlanningAgent:
                 }
             }
         ]
-        
-        messages = [
-            {
-                "role": "system",
-                "content": """You are a helpful AI agent that creates detailed, actionable plans from natural language goals. 
-
-When creating plans, you should:
-1. Break down the goal into clear, day-by-day steps
-2. Use web search to gather current information about places, activities, restaurants, etc.
-3. Use weather information when relevant to the plan
-4. Structure the output as a clear, organized plan with specific times and locations
-5. Include practical details like costs, booking requirements, transportation, etc.
 
-Always use the available tools to gather external information to make your plans more accurate and helpful."""
-            },
+    def _build_messages(self, goal: str) -> List[Dict[str, Any]]:
+        """Initial conversation for a goal"""
+        return [
+            self._system_message,
             {
                 "role": "user",
                 "content": f"Create a detailed plan for this goal: {goal}"
             }
         ]
-        
-        try:
-            # First call to Groq LLM with tool calling
-            headers = {
-                "Authorization": f"Bearer {self.groq_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": "auto",
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code != 200:
-                error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-                error_msg = error_data.get('error', {}).get('message', response.text)
-                
-                if 'model_decommissioned' in error_data.get('error', {}).get('code', ''):
-                    raise Exception(f"Model '{self.model}' has been decommissioned. Please update config.py with a current model. Error: {error_msg}")
-                else:
-                    raise Exception(f"Groq API error: {response.status_code} - {error_msg}")
-            
-            response_data = response.json()
-            message = response_data["choices"][0]["message"]
-            messages.append(message)
-            
-            # Process tool calls if any
-            if message.get("tool_calls"):
+
+    def _request_prefix(self, **fields) -> str:
+        """JSON for the fixed part of a completion request, left open so messages can be appended
+
+        The model is left out; the router adds the one of the endpoint it picks.
+        """
+        return json.dumps({"temperature": 0.7, **fields})[:-1]
+
+    def _encode_request(self, prefix: str, messages: List[Dict[str, Any]], stream: bool = False) -> bytes:
+        body = f'{prefix}, "messages": {json.dumps(messages)}'
+        if stream:
+            body += ', "stream": true'
+        return (body + "}").encode()
+
+    def _post_groq(self, body: bytes, kind: str = "final") -> Dict[str, Any]:
+        """Send one serialised chat completion request and return the parsed response"""
+        with span("groq"):
+            return self.router.complete(body, self._get_session, kind)
+
+    async def _post_groq_async(self, body: bytes, kind: str = "final") -> Dict[str, Any]:
+        """Non-blocking variant of _post_groq, hedged across endpoints"""
+        with span("groq"):
+            return await self.router.complete_async(body, self._get_async_client, kind)
+
+    def _tool_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        return {
+            "tool_call_id": tool_call["id"],
+            "role": "tool",
+            "name": tool_call["function"]["name"],
+            "content": content
+        }
+
+    def _run_tool_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a single tool call and return the tool message"""
+        function_name = tool_call["function"]["name"]
+        function_args = json.loads(tool_call["function"]["arguments"])
+
+        if self.debug_mode:
+            print(f"📞 Calling {function_name} with args: {function_args}")
+
+        tool = self._metric_tool_name(function_name)
+        TOOL_CALLS.inc(tool=tool)
+        with span(f"tool_{tool}"):
+            if function_name == "web_search":
+                function_response = self.web_search(
+                    query=function_args.get("query"),
+                    num_results=function_args.get("num_results", 5)
+                )
                 if self.debug_mode:
-                    print(f"🔧 Processing {len(message['tool_calls'])} tool calls...")
-                
-                for tool_call in message["tool_calls"]:
-                    function_name = tool_call["function"]["name"]
-                    function_args = json.loads(tool_call["function"]["arguments"])
-                    
-                    if self.debug_mode:
-                        print(f"📞 Calling {function_name} with args: {function_args}")
-                    
-                    if function_name == "web_search":
-                        function_response = self.web_search(
-                            query=function_args.get("query"),
-                            num_results=function_args.get("num_results", 5)
-                        )
-                        if self.debug_mode:
-                            print(f"🔍 Web search result: {function_response[:100]}...")
-                    elif function_name == "get_weather":
-                        function_response = self.get_weather(
-                            location=function_args.get("location")
-                        )
-                        if self.debug_mode:
-                            print(f"🌤️ Weather result: {function_response}")
-                    else:
-                        function_response = "Function not available"
-                    
-                    messages.append({
-                        "tool_call_id": tool_call["id"],
-                        "role": "tool",
-                        "name": function_name,
-                        "content": function_response
-                    })
-                
-                # Second call to generate final plan
-                final_payload = {
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.7
-                }
-                
-                final_response = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=final_payload
+                    print(f"🔍 Web search result: {function_response[:100]}...")
+            elif function_name == "get_weather":
+                function_response = self.get_weather(
+                    location=function_args.get("location")
                 )
-                
-                if final_response.status_code != 200:
-                    error_data = final_response.json() if final_response.headers.get('content-type', '').startswith('application/json') else {}
-                    error_msg = error_data.get('error', {}).get('message', final_response.text)
-                    
-                    if 'model_decommissioned' in error_data.get('error', {}).get('code', ''):
-                        raise Exception(f"Model '{self.model}' has been decommissioned. Please update config.py with a current model. Error: {error_msg}")
-                    else:
-                        raise Exception(f"Groq API error: {final_response.status_code} - {error_msg}")
-                
-                final_data = final_response.json()
-                plan_content = final_data["choices"][0]["message"]["content"]
+                if self.debug_mode:
+                    print(f"🌤️ Weather result: {function_response}")
+            else:
+                function_response = "Function not available"
+
+        return self._tool_message(tool_call, function_response)
+
+    async def _run_tool_call_async(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """Non-blocking variant of _run_tool_call"""
+        function_name = tool_call["function"]["name"]
+        function_args = json.loads(tool_call["function"]["arguments"])
+
+        if self.debug_mode:
+            print(f"📞 Calling {function_name} with args: {function_args}")
+
+        tool = self._metric_tool_name(function_name)
+        TOOL_CALLS.inc(tool=tool)
+        with span(f"tool_{tool}"):
+            if function_name == "web_search":
+                function_response = await self.web_search_async(
+                    query=function_args.get("query"),
+                    num_results=function_args.get("num_results", 5)
+                )
+                if self.debug_mode:
+                    print(f"🔍 Web search result: {function_response[:100]}...")
+            elif function_name == "get_weather":
+                function_response = await self.get_weather_async(
+                    location=function_args.get("location")
+                )
+                if self.debug_mode:
+                    print(f"🌤️ Weather result: {function_response}")
+            else:
+                function_response = "Function not available"
+
+        return self._tool_message(tool_call, function_response)
+
+    @staticmethod
+    def _metric_tool_name(function_name: str) -> str:
+        # Tool names come from the model, so keep metric labels to a fixed set
+        return function_name if function_name in ("web_search", "get_weather") else "unknown"
+
+    def _timeout_message(self, tool_call: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        if self.debug_mode:
+            print(f"⏱️ {tool_call['function']['name']} timed out after {timeout:.1f}s")
+        return self._tool_message(tool_call, f"Tool call timed out after {timeout:.1f}s")
+
+    def _run_tool_calls(self, tool_calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run the tool calls of one assistant turn concurrently, preserving their order
+
+        All calls share one deadline, `timeout` seconds after they are
+        submitted. A running thread cannot be stopped, so when a call times
+        out the pool is handed off to finish in the background and the next
+        round starts with a fresh one, rather than with workers still busy.
+        """
+        timeout = self.tool_call_timeout if timeout is None else timeout
+        if self._tool_executor is None:
+            self._tool_executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_tool_calls,
+                thread_name_prefix="tool-call"
+            )
+
+        futures = [self._tool_executor.submit(self._run_tool_call, tool_call) for tool_call in tool_calls]
+        wait_for_futures(futures, timeout=timeout)
+        tool_messages = []
+        timed_out = False
+        for tool_call, future in zip(tool_calls, futures):
+            if future.done():
+                tool_messages.append(future.result())
             else:
-                plan_content = message["content"]
-            
+                future.cancel()
+                timed_out = True
+                tool_messages.append(self._timeout_message(tool_call, timeout))
+        if timed_out:
+            self._tool_executor.shutdown(wait=False)
+            self._tool_executor = None
+        return tool_messages
+
+    async def _run_tool_calls_async(self, tool_calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Non-blocking variant of _run_tool_calls"""
+        timeout = self.tool_call_timeout if timeout is None else timeout
+        semaphore = asyncio.Semaphore(self.max_concurrent_tool_calls)
+
+        async def run_one(tool_call):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self._run_tool_call_async(tool_call), timeout)
+                except asyncio.TimeoutError:
+                    return self._timeout_message(tool_call, timeout)
+
+        return list(await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls)))
+
+    def _tool_round_request(self, messages: List[Dict[str, Any]], stream: bool = False) -> bytes:
+        """Completion request that lets the model ask for tools"""
+        return self._encode_request(self._tool_request_prefix, messages, stream)
+
+    def _final_request(self, messages: List[Dict[str, Any]], stream: bool = False) -> bytes:
+        """Completion request that writes the plan from the gathered tool results"""
+        return self._encode_request(self._final_request_prefix, messages, stream)
+
+    def _trim_context(self, messages: List[Dict[str, Any]], budget: "RunBudget") -> List[Dict[str, Any]]:
+        """Fit the tool results gathered so far into the context budget before the next call"""
+        messages, saved = trim_tool_results(messages)
+        if saved:
+            budget.context_tokens_saved += saved
+            CONTEXT_TOKENS_SAVED.inc(saved)
+            if self.debug_mode:
+                print(f"✂️ Trimmed tool results by ~{saved} tokens")
+        return messages
+
+    def _result(self, goal: str, budget: "RunBudget", plan_content: str = None, stop_reason: str = None, error: Exception = None) -> Dict[str, Any]:
+        if error is not None:
             return {
                 "goal": goal,
-                "plan": plan_content,
-                "status": "success"
+                "plan": f"Error creating plan: {str(error)}",
+                "status": "error",
+                "stop_reason": "error",
+                **budget.summary()
             }
-            
+        return {
+            "goal": goal,
+            "plan": plan_content,
+            "status": "success",
+            "stop_reason": stop_reason,
+            **budget.summary()
+        }
+
+    def create_plan(self, goal: str, max_rounds: int = None, deadline_seconds: float = None, token_budget: int = None) -> Dict[str, Any]:
+        """Create a detailed plan using LLM with tool calling
+
+        The model may ask for tools over several rounds. Rounds stop when it
+        answers without tools or a round, deadline or token limit is reached;
+        in the latter case one last call writes the plan from what was gathered.
+        """
+        budget = RunBudget(max_rounds, deadline_seconds, token_budget)
+        messages = self._build_messages(goal)
+        plan_content = None
+        stop_reason = None
+
+        try:
+            while plan_content is None:
+                stop_reason = budget.stop_reason()
+                if stop_reason:
+                    break
+
+                started = time.monotonic()
+                response_data = self._post_groq(self._tool_round_request(messages), "tools")
+                usage = budget.record_usage(response_data.get("usage"))
+                llm_seconds = time.monotonic() - started
+
+                message = response_data["choices"][0]["message"]
+                messages.append(message)
+
+                if not message.get("tool_calls"):
+                    budget.add_round(llm_seconds, usage=usage, final=True)
+                    plan_content = message.get("content") or ""
+                    stop_reason = "complete"
+                    break
+
+                if self.debug_mode:
+                    print(f"🔧 Processing {len(message['tool_calls'])} tool calls...")
+
+                started = time.monotonic()
+                messages.extend(self._run_tool_calls(message["tool_calls"], budget.tool_timeout(self.tool_call_timeout)))
+                messages = self._trim_context(messages, budget)
+                budget.add_round(llm_seconds, time.monotonic() - started, len(message["tool_calls"]), usage)
+
+            if plan_content is None:
+                # Out of rounds or budget: write the plan from what has been gathered
+                started = time.monotonic()
+                final_data = self._post_groq(self._final_request(messages))
+                usage = budget.record_usage(final_data.get("usage"))
+                plan_content = final_data["choices"][0]["message"]["content"]
+                budget.add_round(time.monotonic() - started, usage=usage, final=True)
+
+            return self._result(goal, budget, plan_content, stop_reason)
+
         except Exception as e:
-            return {
-                "goal": goal,
-                "plan": f"Error creating plan: {str(e)}",
-                "status": "error"
-            }
+            return self._result(goal, budget, error=e)
+
+    async def create_plan_async(self, goal: str, max_rounds: int = None, deadline_seconds: float = None, token_budget: int = None) -> Dict[str, Any]:
+        """Non-blocking variant of create_plan for use inside the event loop"""
+        budget = RunBudget(max_rounds, deadline_seconds, token_budget)
+        async for event in self._plan_events(goal, budget, stream_final=False):
+            if event["event"] == "done":
+                return event["data"]
+
+    async def stream_plan(self, goal: str, max_rounds: int = None, deadline_seconds: float = None, token_budget: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """Create a plan, yielding progress and token events as they happen
+
+        Each event is a dict with "event" and "data" keys. The last event is
+        always "done", carrying the same result dict as create_plan_async.
+        """
+        budget = RunBudget(max_rounds, deadline_seconds, token_budget)
+        async for event in self._plan_events(goal, budget, stream_final=True):
+            yield event
+
+    async def _plan_events(self, goal: str, budget: "RunBudget", stream_final: bool) -> AsyncIterator[Dict[str, Any]]:
+        """The async agent loop behind create_plan_async and stream_plan
+
+        Tool progress is always reported; token events are only produced
+        when stream_final is set, in which case every completion is streamed
+        from Groq and content is forwarded as it arrives, while tool call
+        fragments are collected to decide whether another round follows.
+        """
+        messages = self._build_messages(goal)
+        plan_content = None
+        stop_reason = None
+
+        try:
+            while plan_content is None:
+                stop_reason = budget.stop_reason()
+                if stop_reason:
+                    break
+
+                started = time.monotonic()
+                if stream_final:
+                    message: Dict[str, Any] = {}
+                    stream_usage: Dict[str, Any] = {}
+                    async for content in self._stream_round(self._tool_round_request(messages, stream=True), message, stream_usage):
+                        yield {"event": "token", "data": {"content": content}}
+                    usage = budget.record_usage(stream_usage)
+                else:
+                    response_data = await self._post_groq_async(self._tool_round_request(messages), "tools")
+                    usage = budget.record_usage(response_data.get("usage"))
+                    message = response_data["choices"][0]["message"]
+                llm_seconds = time.monotonic() - started
+                messages.append(message)
+
+                if not message.get("tool_calls"):
+                    budget.add_round(llm_seconds, usage=usage, final=True)
+                    plan_content = message.get("content") or ""
+                    stop_reason = "complete"
+                    break
+
+                tool_calls = message["tool_calls"]
+                round_number = len(budget.rounds) + 1
+                if self.debug_mode:
+                    print(f"🔧 Processing {len(tool_calls)} tool calls...")
+                for index, tool_call in enumerate(tool_calls):
+                    yield {"event": "tool_call", "data": {
+                        "round": round_number,
+                        "index": index,
+                        "name": tool_call["function"]["name"],
+                        "arguments": tool_call["function"]["arguments"]
+                    }}
+
+                started = time.monotonic()
+                tool_messages = await self._run_tool_calls_async(tool_calls, budget.tool_timeout(self.tool_call_timeout))
+                budget.add_round(llm_seconds, time.monotonic() - started, len(tool_calls), usage)
+                for index, tool_message in enumerate(tool_messages):
+                    yield {"event": "tool_result", "data": {
+                        "round": round_number,
+                        "index": index,
+                        "name": tool_message["name"],
+                        "preview": tool_message["content"][:200]
+                    }}
+                messages.extend(tool_messages)
+                messages = self._trim_context(messages, budget)
+
+            if plan_content is None:
+                # Out of rounds or budget: write the plan from what has been gathered
+                started = time.monotonic()
+                if stream_final:
+                    parts = []
+                    stream_usage: Dict[str, Any] = {}
+                    async for content in self._stream_completion(self._final_request(messages, stream=True), stream_usage):
+                        parts.append(content)
+                        yield {"event": "token", "data": {"content": content}}
+                    plan_content = "".join(parts)
+                    usage = budget.record_usage(stream_usage)
+                else:
+                    final_data = await self._post_groq_async(self._final_request(messages))
+                    usage = budget.record_usage(final_data.get("usage"))
+                    plan_content = final_data["choices"][0]["message"]["content"]
+                budget.add_round(time.monotonic() - started, usage=usage, final=True)
+
+            result = self._result(goal, budget, plan_content, stop_reason)
+
+        except Exception as e:
+            result = self._result(goal, budget, error=e)
+
+        yield {"event": "done", "data": result}
+
+    async def _stream_round(self, body: bytes, message: Dict[str, Any], usage: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Yield content deltas of a streamed tool-enabled completion, assembling the full assistant message into `message`
+
+        Tool calls arrive as fragments keyed by index: the id and name come
+        once and the JSON arguments are split across chunks.
+        """
+        parts: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        async for delta in self.router.stream_deltas(body, self._get_async_client, usage):
+            content = delta.get("content")
+            if content:
+                parts.append(content)
+                yield content
+            for fragment in delta.get("tool_calls") or []:
+                call = tool_calls.setdefault(fragment.get("index", len(tool_calls)), {
+                    "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                })
+                call["id"] = fragment.get("id") or call["id"]
+                function = fragment.get("function") or {}
+                call["function"]["name"] += function.get("name") or ""
+                call["function"]["arguments"] += function.get("arguments") or ""
+        message.update(role="assistant", content="".join(parts) or None)
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+
+    async def _stream_completion(self, body: bytes, usage: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Yield content deltas from a streamed chat completion request
+
+        Token usage from the closing chunk, if the endpoint sends one, is copied into `usage`.
+        """
+        async for content in self.router.stream_completion(body, self._get_async_client, usage):
+            yield content
+
+
+class RunBudget:
+    """Round, wall-clock and token limits for one planning run, plus its per-round timings
+
+    The limits only stop further tool rounds; the plan is then written from
+    whatever has been gathered so far.
+    """
+
+    def __init__(self, max_rounds: int = None, deadline_seconds: float = None, token_budget: int = None):
+        self.max_rounds = max_rounds or Config.AGENT_MAX_ROUNDS
+        self.deadline_seconds = Config.AGENT_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        self.token_budget = Config.AGENT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.started = time.monotonic()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.context_tokens_saved = 0
+        self.rounds: List[Dict[str, Any]] = []
+
+    @property
+    def tokens_used(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without one"""
+        if not self.deadline_seconds:
+            return None
+        return max(0.0, self.deadline_seconds - (time.monotonic() - self.started))
+
+    def tool_timeout(self, default: float) -> float:
+        remaining = self.remaining()
+        return default if remaining is None else max(0.1, min(default, remaining))
+
+    def record_usage(self, usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        usage = usage or {}
+        record_usage(usage)
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+    def stop_reason(self) -> Optional[str]:
+        """Why no further tool round should start, or None to keep going"""
+        if len(self.rounds) >= self.max_rounds:
+            return "max_rounds"
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            return "deadline"
+        if self.token_budget and self.tokens_used >= self.token_budget:
+            return "token_budget"
+        return None
+
+    def add_round(self, llm_seconds: float, tool_seconds: float = 0.0, tool_calls: int = 0, usage: Dict[str, int] = None, final: bool = False):
+        self.rounds.append({
+            "round": len(self.rounds) + 1,
+            "llm_ms": round(llm_seconds * 1000, 1),
+            "tool_ms": round(tool_seconds * 1000, 1),
+            "tool_calls": tool_calls,
+            **(usage or {}),
+            "final": final
+        })
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "usage": {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.tokens_used
+            },
+            "context_tokens_saved": self.context_tokens_saved,
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000, 1)
+        }
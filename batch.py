@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Bulk plan generation from a JSONL file of goals
+
+Each input line is either a JSON object with a "goal" field (an optional
+"id" or "request_id" is echoed back as "ref") or a bare JSON string.
+Results are written as NDJSON, one line per input line:
+    python batch.py goals.jsonl -o results.ndjson --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import Plan
+from plan_cache import PlanCache, normalize_goal
+
+
+def parse_goals(lines) -> List[Dict[str, Any]]:
+    """Read goal items from JSONL lines; unreadable lines become items with an error"""
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        item = {"index": len(items), "line": line_number, "ref": None, "goal": None}
+        try:
+            value = json.loads(line)
+        except ValueError:
+            item["error"] = "Invalid JSON"
+            items.append(item)
+            continue
+        if isinstance(value, dict):
+            item["ref"] = value.get("id", value.get("request_id"))
+            value = value.get("goal")
+        if isinstance(value, str) and value.strip():
+            item["goal"] = value.strip()
+        else:
+            item["error"] = "Missing goal"
+        items.append(item)
+    return items
+
+
+class BatchPlanner:
+    """Plans many goals with bounded concurrency and stores them in bulk
+
+    Goals that normalise to the same text are generated once and every copy
+    points at the same stored plan. Cached goals are answered from the plan
+    cache. Only the LLM calls run concurrently; all database work stays on
+    the caller's session and is committed every `commit_size` plans, or
+    sooner once a finished plan has waited `flush_seconds`.
+    """
+
+    def __init__(self, agent, plan_cache: Optional[PlanCache] = None, concurrency: int = None, commit_size: int = None,
+                 flush_seconds: float = None):
+        self.agent = agent
+        self.plan_cache = plan_cache
+        self.concurrency = concurrency or Config.BATCH_CONCURRENCY
+        self.commit_size = commit_size or Config.BATCH_COMMIT_SIZE
+        self.flush_seconds = Config.BATCH_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+
+    async def run(self, db: AsyncSession, items: List[Dict[str, Any]], bypass_cache: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result per item as soon as its plan has been committed"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            if item.get("error"):
+                yield self._line(item, "error", error=item["error"])
+                continue
+            key = normalize_goal(item["goal"]) or item["goal"]
+            groups.setdefault(key, []).append(item)
+
+        pending = []
+        for group in groups.values():
+            cached_plan = None
+            if self.plan_cache is not None and Config.PLAN_CACHE_ENABLED and not bypass_cache:
+                cached_plan = await self.plan_cache.lookup(db, group[0]["goal"])
+            if cached_plan is not None:
+                for line in self._group_lines(group, cached_plan, "cached"):
+                    yield line
+            else:
+                pending.append(group)
+
+        # End the lookup transaction, so the session holds no connection while plans generate
+        await db.commit()
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def generate(group):
+            async with semaphore:
+                return group, await self.agent.create_plan_async(group[0]["goal"])
+
+        tasks = [asyncio.create_task(generate(group)) for group in pending]
+        try:
+            running = set(tasks)
+            finished = []
+            flush_at = None
+            while running:
+                timeout = None if flush_at is None else max(0.0, flush_at - time.monotonic())
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finished.extend(task.result() for task in done)
+                if finished and flush_at is None:
+                    flush_at = time.monotonic() + self.flush_seconds
+                # Commit a full chunk, or whatever has waited flush_seconds, so small batches still stream
+                if finished and (len(finished) >= self.commit_size or time.monotonic() >= flush_at or not running):
+                    for line in await self._store(db, finished):
+                        yield line
+                    finished, flush_at = [], None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _store(self, db: AsyncSession, finished) -> List[Dict[str, Any]]:
+        """Insert a chunk of generated plans in one transaction"""
+        plans = [Plan(goal=result["goal"], plan_content=result["plan"]) for _, result in finished]
+        db.add_all(plans)
+        await db.flush()
+        if self.plan_cache is not None:
+            for plan, (_, result) in zip(plans, finished):
+                if result["status"] == "success":
+                    self.plan_cache.record(db, result["goal"], plan)
+        await db.commit()
+
+        lines = []
+        for plan, (group, result) in zip(plans, finished):
+            error = result["plan"] if result["status"] == "error" else None
+            lines.extend(self._group_lines(group, plan, result["status"], error))
+        return lines
+
+    def _group_lines(self, group: List[Dict[str, Any]], plan: Plan, status: str, error: str = None) -> List[Dict[str, Any]]:
+        first = group[0]
+        lines = [self._line(first, status, plan, error)]
+        for duplicate in group[1:]:
+            lines.append(self._line(duplicate, status, plan, error, duplicate_of=first["index"]))
+        return lines
+
+    @staticmethod
+    def _line(item: Dict[str, Any], status: str, plan: Plan = None, error: str = None, duplicate_of: int = None) -> Dict[str, Any]:
+        line = {
+            "index": item["index"],
+            "line": item["line"],
+            "ref": item["ref"],
+            "goal": item["goal"],
+            "status": status,
+            "plan_id": plan.id if plan is not None else None,
+            "plan_content": plan.plan_content if plan is not None and error is None else None
+        }
+        if error:
+            line["error"] = error
+        if duplicate_of is not None:
+            line["duplicate_of"] = duplicate_of
+        return line
+
+
+async def run_file(path: str, output, concurrency: int, bypass_cache: bool) -> Dict[str, int]:
+    from agent import TaskPlanningAgent
+    from database import AsyncSessionLocal, create_tables
+
+    create_tables()
+    with open(path, "r", encoding="utf-8") as f:
+        items = parse_goals(f)
+
+    agent = TaskPlanningAgent(debug_mode=Config.DEBUG_MODE)
+    planner = BatchPlanner(agent, PlanCache(), concurrency)
+    counts: Dict[str, int] = {}
+    try:
+        async with AsyncSessionLocal() as db:
+            async for line in planner.run(db, items, bypass_cache):
+                counts[line["status"]] = counts.get(line["status"], 0) + 1
+                output.write(json.dumps(line) + "\n")
+                output.flush()
+    finally:
+        await agent.aclose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate plans for every goal in a JSONL file")
+    parser.add_argument("input", help="JSONL file of goals")
+    parser.add_argument("-o", "--output", help="NDJSON results file (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=Config.BATCH_CONCURRENCY, help="Goals planned in parallel")
+    parser.add_argument("--bypass-cache", action="store_true", help="Regenerate goals that already have a cached plan")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        counts = asyncio.run(run_file(args.input, output, args.concurrency, args.bypass_cache))
+    finally:
+        if args.output:
+            output.close()
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "no goals"
+    print(f"✅ Batch finished: {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the planning API
+
+Starts mock_upstreams.py and the app (uvicorn, one worker) on free local
+ports with a throwaway database, then drives each workload at fixed
+concurrency levels and reports latency percentiles, throughput and the
+app's memory. No API keys or network access are needed.
+
+    python benchmark.py --concurrency 1,8,32 --requests 200 --latency-ms 300
+    python benchmark.py --compare bench-results/before.json
+    python benchmark.py --workloads startup --startup-runs 5
+
+Workloads:
+    plan     POST /api/plan with a fresh goal per request (plan cache bypassed)
+    plans    GET /api/plans, first page
+    batch    one POST /api/plans/batch of --requests goals; latency is time to each result line
+    startup  cold `import main` time and time from launching uvicorn to the first /health answer
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent
+WORKLOADS = ("plan", "plans", "batch", "startup")
+DEFAULT_WORKLOADS = ("plan", "plans", "batch")
+CITIES = ["Paris", "Tokyo", "Hyderabad", "Goa", "Shimla", "Delhi", "Jaipur", "Manali", "Rome", "Lisbon"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def memory_mb(pid: int) -> Dict[str, Optional[float]]:
+    """Current and peak resident memory of a process (Linux only)"""
+    values = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    values["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return values
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float, completed: int) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": completed,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(completed / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else None,
+            "max": ms(ordered[-1]) if ordered else None
+        }
+    }
+
+
+async def run_closed_loop(total: int, concurrency: int, send: Callable[[int], Awaitable[bool]]) -> Dict[str, Any]:
+    """Send `total` requests from `concurrency` workers that each wait for their previous response"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await send(index)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, total)
+
+
+def goal_for(run_id: str, label: str, index: int) -> str:
+    return f"Plan a 2-day trip to {CITIES[index % len(CITIES)]} ({run_id}-{label}-{index})"
+
+
+async def bench_plan(client: httpx.AsyncClient, run_id: str, total: int, concurrency: int) -> Dict[str, Any]:
+    async def send(index: int) -> bool:
+        goal = goal_for(run_id, f"plan-c{concurrency}", index)
+        response = await client.post("/api/plan", json={"goal": goal, "bypass_cache": True})
+        return response.status_code == 200 and "Error creating plan" not in response.json()["plan_content"]
+
+    return await run_closed_loop(total, concurrency, send)
+
+
+async def bench_plans(client: httpx.AsyncClient, run_id: str, total: int, concurrency: int) -> Dict[str, Any]:
+    async def send(index: int) -> bool:
+        response = await client.get("/api/plans", params={"limit": 20})
+        return response.status_code == 200
+
+    return await run_closed_loop(total, concurrency, send)
+
+
+async def bench_batch(client: httpx.AsyncClient, run_id: str, total: int, concurrency: int) -> Dict[str, Any]:
+    body = "\n".join(json.dumps({"goal": goal_for(run_id, f"batch-c{concurrency}", i)}) for i in range(total))
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    async with client.stream(
+        "POST", "/api/plans/batch",
+        params={"concurrency": concurrency, "bypass_cache": "true"},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return summarize([], total, time.perf_counter() - started, 0)
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            latencies.append(time.perf_counter() - started)
+            if json.loads(line)["status"] == "error":
+                errors += 1
+    return summarize(latencies, errors, time.perf_counter() - started, len(latencies))
+
+
+BENCHMARKS = {"plan": bench_plan, "plans": bench_plans, "batch": bench_batch}
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def spread(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {
+        "p50": round(percentile(ordered, 50) * 1000, 1) if ordered else None,
+        "min": round(ordered[0] * 1000, 1) if ordered else None,
+        "max": round(ordered[-1] * 1000, 1) if ordered else None
+    }
+
+
+def measure_startup(runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """Cold-start cost of the app, each run in a fresh interpreter"""
+    import_times, first_request_times = [], []
+    for run in range(runs):
+        print(f"⏱️  startup run {run + 1}/{runs} ...", file=sys.stderr)
+        output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        import_times.append(float(output.strip().splitlines()[-1]))
+
+        port = free_port()
+        started = time.perf_counter()
+        app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                                "--log-level", "warning"], cwd=ROOT, env=env)
+        try:
+            with httpx.Client(timeout=1.0) as client:
+                while app.poll() is None:
+                    try:
+                        if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                            first_request_times.append(time.perf_counter() - started)
+                            break
+                    except httpx.HTTPError:
+                        time.sleep(0.01)
+        finally:
+            app.terminate()
+            app.wait(timeout=10)
+
+    startup = {"runs": runs, "import_ms": spread(import_times), "first_request_ms": spread(first_request_times)}
+    print(f"   import p50 {startup['import_ms']['p50']} ms  first request p50 {startup['first_request_ms']['p50']} ms", file=sys.stderr)
+    return startup
+
+
+async def run_benchmarks(app_url: str, app_pid: int, workloads: List[str], levels: List[int], total: int) -> List[Dict[str, Any]]:
+    run_id = datetime.utcnow().strftime("%H%M%S")
+    results = []
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=app_url, timeout=300.0, limits=limits) as client:
+        for workload in workloads:
+            for concurrency in levels:
+                print(f"⏱️  {workload} @ concurrency {concurrency} ...", file=sys.stderr)
+                result = await BENCHMARKS[workload](client, run_id, total, concurrency)
+                result = {"workload": workload, "concurrency": concurrency, **result, "memory": memory_mb(app_pid)}
+                results.append(result)
+                latency = result["latency_ms"]
+                print(f"   p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                      f"{result['rps']} rps  {result['errors']} errors", file=sys.stderr)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report: Dict[str, Any], baseline_path: str):
+    """Print p95, RPS and startup changes against a previous results file"""
+    with open(baseline_path) as f:
+        previous = json.load(f)
+    baseline = {(r["workload"], r["concurrency"]): r for r in previous["results"]}
+    print(f"\n📊 Compared with {baseline_path}", file=sys.stderr)
+    for key in ("import_ms", "first_request_ms"):
+        before = (previous.get("startup") or {}).get(key, {}).get("p50")
+        after = (report.get("startup") or {}).get(key, {}).get("p50")
+        if before and after is not None:
+            print(f"   startup {key:<16} {before} -> {after} ms ({(after - before) / before:+.1%})", file=sys.stderr)
+    for result in report["results"]:
+        before = baseline.get((result["workload"], result["concurrency"]))
+        if before is None:
+            continue
+        p95_before, p95_after = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        rps_before, rps_after = before["rps"], result["rps"]
+        p95_change = f"{(p95_after - p95_before) / p95_before:+.1%}" if p95_before and p95_after is not None else "n/a"
+        rps_change = f"{(rps_after - rps_before) / rps_before:+.1%}" if rps_before and rps_after is not None else "n/a"
+        print(f"   {result['workload']:>5} @ {result['concurrency']:<3} p95 {p95_change:>8}  rps {rps_change:>8}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the planning API against local mock upstreams")
+    parser.add_argument("--workloads", default=",".join(DEFAULT_WORKLOADS), help="Comma-separated subset of: " + ", ".join(WORKLOADS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests (or batch goals) per workload and level")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean mock Groq latency")
+    parser.add_argument("--tool-latency-ms", type=float, default=None, help="Mean mock search/weather latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform +/- jitter on mock latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock upstream calls answered with 503")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of mock Groq calls that are slow outliers")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="Extra latency of a slow mock Groq call")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters measured by the startup workload")
+    parser.add_argument("--output", help="Results file (default: bench-results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    request_workloads = [w for w in workloads if w != "startup"]
+
+    mock_port, app_port = free_port(), free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    with tempfile.TemporaryDirectory(prefix="plan-bench-") as workdir:
+        mock_cmd = [sys.executable, str(ROOT / "mock_upstreams.py"), "--port", str(mock_port),
+                    "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                    "--error-rate", str(args.error_rate), "--tail-rate", str(args.tail_rate), "--tail-ms", str(args.tail_ms)]
+        if args.tool_latency_ms is not None:
+            mock_cmd += ["--tool-latency-ms", str(args.tool_latency_ms)]
+
+        app_env = {
+            # The mock has no rate limits; set GROQ_RPM/GROQ_TPM to benchmark the limiter itself
+            "GROQ_RPM": "0",
+            "GROQ_TPM": "0",
+            **os.environ,
+            "GROQ_API_KEY": "benchmark",
+            "OPENWEATHER_API_KEY": "benchmark",
+            "GROQ_BASE_URL": f"{mock_url}/openai/v1",
+            "SEARCH_API_URL": f"{mock_url}/duckduckgo/",
+            "WEATHER_API_URL": f"{mock_url}/weather",
+            "DATABASE_URL": f"sqlite:///{Path(workdir) / 'bench.db'}",
+            "DEBUG_MODE": "false"
+        }
+        app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                   "--log-level", "warning", "--no-access-log"]
+
+        started_at = datetime.utcnow()
+        startup = measure_startup(args.startup_runs, app_env) if "startup" in workloads else None
+        results, upstream_calls = [], None
+
+        mock = subprocess.Popen(mock_cmd, cwd=ROOT) if request_workloads else None
+        app = None
+        try:
+            if request_workloads:
+                wait_until_ready(f"{mock_url}/health", mock)
+                app = subprocess.Popen(app_cmd, cwd=ROOT, env=app_env)
+                wait_until_ready(f"{app_url}/health", app)
+                results = asyncio.run(run_benchmarks(app_url, app.pid, request_workloads, levels, args.requests))
+                upstream_calls = httpx.get(f"{mock_url}/stats").json()
+        finally:
+            for process in (app, mock):
+                if process is not None and process.poll() is None:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+
+    report = {
+        "started_at": started_at.isoformat() + "Z",
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "settings": {
+            "workloads": workloads,
+            "concurrency": levels,
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "tool_latency_ms": args.tool_latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "tail_rate": args.tail_rate,
+            "tail_ms": args.tail_ms
+        },
+        "upstream_calls": upstream_calls,
+        "startup": startup,
+        "results": results
+    }
+
+    output = Path(args.output) if args.output else ROOT / "bench-results" / f"{started_at:%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"✅ Results saved to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
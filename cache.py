@@ -0,0 +1,255 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from config import Config
+from metrics import WARMED_HITS
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and collapse whitespace so equivalent arguments share a key"""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+class LRUCache:
+    """Size-bounded in-memory cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Expiring key/value store in a SQLite file, shared by every worker process
+
+    Every purge_every writes, expired rows are deleted and, past max_rows,
+    the rows closest to expiry are dropped, so the file stays bounded.
+    """
+
+    def __init__(self, path: str, max_rows: int = 10000, purge_every: int = 100):
+        self.path = path
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, seconds left to live), or None when missing or expired"""
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return None
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any, ttl: float):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            due = self.purge_every > 0 and self._writes % self.purge_every == 0
+        if due:
+            self.prune()
+
+    def purge_expired(self) -> int:
+        conn = self._connection()
+        deleted = conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        conn.commit()
+        return deleted
+
+    def prune(self) -> int:
+        """Delete expired rows, then the soonest to expire beyond max_rows; returns how many went"""
+        deleted = self.purge_expired()
+        if self.max_rows > 0:
+            conn = self._connection()
+            deleted += conn.execute(
+                "DELETE FROM tool_cache WHERE key IN ("
+                "SELECT key FROM tool_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,)
+            ).rowcount
+            conn.commit()
+        return deleted
+
+
+class ToolResultCache:
+    """Two-tier cache for tool results: in-process LRU in front of an optional SQLite tier"""
+
+    def __init__(self, maxsize: int = 1024, db_path: Optional[str] = None, db_max_rows: int = 10000, db_purge_every: int = 100):
+        self.memory = LRUCache(maxsize)
+        self.shared = SQLiteCache(db_path, db_max_rows, db_purge_every) if db_path else None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.warmed_hits = 0
+        # Keys last refreshed by the cache warmer; hits on them are counted as warmed hits
+        self.warmed_keys: Set[str] = set()
+
+    @staticmethod
+    def make_key(tool: str, **arguments) -> str:
+        normalized = {
+            name: normalize_text(value) if isinstance(value, str) else value
+            for name, value in arguments.items()
+        }
+        return f"{tool}:{json.dumps(normalized, sort_keys=True)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get_memory(key)
+        if value is None and self.shared is not None:
+            value = self._get_shared(key)
+        if value is None:
+            self._count("misses")
+        return value
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """Non-blocking variant of get; the SQLite tier is read on a worker thread"""
+        value = self._get_memory(key)
+        if value is None and self.shared is not None:
+            value = await self._off_loop(self._get_shared, key)
+        if value is None:
+            self._count("misses")
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            self._set_shared(key, value, ttl)
+
+    async def set_async(self, key: str, value: Any, ttl: float):
+        """Non-blocking variant of set; the SQLite tier is written on a worker thread"""
+        self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            await self._off_loop(self._set_shared, key, value, ttl)
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            self._note_warmed(key)
+        return value
+
+    def _get_shared(self, key: str) -> Optional[Any]:
+        try:
+            entry = self.shared.get(key)
+        except sqlite3.Error:
+            return None
+        if entry is None:
+            return None
+        value, remaining = entry
+        self.memory.set(key, value, remaining)
+        self._count("shared_hits")
+        self._note_warmed(key)
+        return value
+
+    def _set_shared(self, key: str, value: Any, ttl: float):
+        try:
+            self.shared.set(key, value, ttl)
+        except sqlite3.Error:
+            pass
+
+    async def _off_loop(self, operation: Callable, *args):
+        """Run SQLite tier I/O on a dedicated thread, so lock waits and commits never block the event loop"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tool-cache")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, operation, *args)
+
+    def mark_warmed(self, keys: Iterable[str]):
+        """Replace the set of keys whose hits count as warmed"""
+        self.warmed_keys = set(keys)
+
+    def _note_warmed(self, key: str):
+        if key in self.warmed_keys:
+            self._count("warmed_hits")
+            WARMED_HITS.inc(cache="tool")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "warmed_hits": self.warmed_hits,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "shared_tier": self.shared is not None
+        }
+
+
+_tool_cache: Optional[ToolResultCache] = None
+
+
+def get_tool_cache() -> ToolResultCache:
+    """Process-wide tool cache, shared by every agent instance"""
+    global _tool_cache
+    if _tool_cache is None:
+        _tool_cache = ToolResultCache(
+            Config.TOOL_CACHE_SIZE, Config.TOOL_CACHE_DB_PATH or None,
+            Config.TOOL_CACHE_DB_MAX_ROWS, Config.TOOL_CACHE_PURGE_EVERY
+        )
+    return _tool_cache
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import random
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import ToolResultCache
+from config import Config
+from database import AsyncSessionLocal, Plan, PlanCacheEntry, WarmerRun
+from metrics import WARMER_ITEMS
+from plan_cache import PlanCache, normalize_goal
+
+# Generates and stores a plan for the warmer:
+# (goal, token budget) -> (stored plan, or None when generation failed; tokens used)
+PlanGenerator = Callable[[str, int], Awaitable[Tuple[Optional[Plan], int]]]
+
+# Capitalised place name after "to", "in", "visit", ...: "trip to New York in May" -> "New York"
+LOCATION_PATTERN = re.compile(r"\b(?:to|in|at|around|near|visit|visiting|explore|exploring)\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)")
+NOT_PLACE_WORDS = {
+    "a", "an", "and", "the", "this", "next", "for", "with", "during", "on", "in", "trip", "weekend", "week", "day", "days",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "spring", "summer", "autumn", "fall", "winter"
+}
+
+# The warmer calls the search tool with the default result count, as the model usually does
+SEARCH_RESULTS = 5
+
+
+def extract_location(goal: str) -> Optional[str]:
+    """Best guess at the place a goal is about, or None"""
+    for match in LOCATION_PATTERN.finditer(goal or ""):
+        words = []
+        for word in match.group(1).split():
+            if word.lower() in NOT_PLACE_WORDS:
+                break
+            words.append(word)
+        if words:
+            return " ".join(words)
+    return None
+
+
+def parse_window(window: str) -> Optional[Tuple[int, int]]:
+    """Local "HH:MM-HH:MM" as start and end minutes past midnight, or None for no restriction"""
+    if not window or not window.strip():
+        return None
+    start, end = (datetime.strptime(part.strip(), "%H:%M") for part in window.split("-", 1))
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def in_window(window: Optional[Tuple[int, int]], now: datetime = None) -> bool:
+    if window is None:
+        return True
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    # The window wraps past midnight, e.g. 22:00-06:00
+    return minute >= start or minute < end
+
+
+async def mine_popular(db: AsyncSession, lookback_days: int = None, scan_limit: int = None,
+                       top_goals: int = None, top_locations: int = None) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """Most frequent normalised goals and locations among recent plans, each as (newest spelling, count)"""
+    lookback_days = lookback_days or Config.CACHE_WARMER_LOOKBACK_DAYS
+    cutoff = datetime.utcnow() - timedelta(days=lookback_days)
+    goals = (await db.execute(
+        select(Plan.goal)
+        .where(Plan.created_at >= cutoff)
+        .order_by(Plan.id.desc())
+        .limit(scan_limit or Config.CACHE_WARMER_SCAN_LIMIT)
+    )).scalars().all()
+
+    goal_counts, location_counts = Counter(), Counter()
+    goal_spellings, location_spellings = {}, {}
+    for goal in goals:
+        normalized = normalize_goal(goal)
+        if normalized:
+            goal_counts[normalized] += 1
+            goal_spellings.setdefault(normalized, goal)
+        location = extract_location(goal)
+        if location:
+            location_counts[location.lower()] += 1
+            location_spellings.setdefault(location.lower(), location)
+
+    return (
+        [(goal_spellings[key], count) for key, count in goal_counts.most_common(top_goals or Config.CACHE_WARMER_TOP_GOALS)],
+        [(location_spellings[key], count) for key, count in location_counts.most_common(top_locations or Config.CACHE_WARMER_TOP_LOCATIONS)]
+    )
+
+
+class CacheWarmer:
+    """Periodically refreshes tool results and pre-generates plans for what users ask for most
+
+    Each pass mines the plans table for popular goals and locations,
+    re-fetches web_search and get_weather results for the locations and,
+    when pregenerate is on, stores fresh plans for popular goals whose
+    cached plan is missing or due to expire, until the token budget is
+    spent. Passes only start inside the off-peak window. A warmer_runs row
+    claims each interval, so with several workers only one of them warms,
+    and every worker counts hits on what the latest passes prepared.
+    """
+
+    def __init__(self, agent_factory: Callable[[], Any], generate_plan: PlanGenerator, tool_cache: ToolResultCache,
+                 plan_cache: PlanCache, interval: float = None, window: str = None, pregenerate: bool = None, token_budget: int = None):
+        self.agent_factory = agent_factory
+        self.generate_plan = generate_plan
+        self.tool_cache = tool_cache
+        self.plan_cache = plan_cache
+        self.interval = interval or Config.CACHE_WARMER_INTERVAL
+        self.window = parse_window(Config.CACHE_WARMER_WINDOW if window is None else window)
+        self.pregenerate = Config.CACHE_WARMER_PREGENERATE if pregenerate is None else pregenerate
+        self.token_budget = Config.CACHE_WARMER_TOKEN_BUDGET if token_budget is None else token_budget
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="cache-warmer")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        # Workers started together would otherwise all try to claim the first pass at once
+        await asyncio.sleep(random.uniform(1, 10))
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"⚠️  Cache warmer pass failed: {e}")
+            # Check often enough to catch the start of the window
+            await asyncio.sleep(min(self.interval, 300))
+
+    async def tick(self) -> Optional[Dict[str, Any]]:
+        """Track what recent passes warmed, then run a pass if one is due; returns its report"""
+        async with AsyncSessionLocal() as db:
+            await self._track(db)
+            if not in_window(self.window):
+                return None
+            due_after = datetime.utcnow() - timedelta(seconds=self.interval)
+            if await db.scalar(select(WarmerRun.id).where(WarmerRun.started_at > due_after).limit(1)) is not None:
+                return None
+
+            run = WarmerRun()
+            db.add(run)
+            await db.commit()
+            # Another worker claimed the same interval a moment earlier; leave the pass to it
+            earlier = await db.scalar(select(WarmerRun.id).where(WarmerRun.id < run.id, WarmerRun.started_at > due_after).limit(1))
+            if earlier is not None:
+                await db.delete(run)
+                await db.commit()
+                return None
+
+            try:
+                await self.run(db, run)
+            except Exception as e:
+                run.status = "failed"
+                run.error = str(e)
+                run.finished_at = datetime.utcnow()
+                await db.commit()
+                raise
+            await self._track(db)
+            return self.last_run
+
+    async def run(self, db: AsyncSession, run: WarmerRun):
+        """One warming pass, recorded on the given run row"""
+        goals, locations = await mine_popular(db)
+        run.goals = len(goals)
+        places = [location for location, _ in locations]
+        run.locations = json.dumps(places)
+        run.tool_refreshes = await self.refresh_tools(places)
+        await db.commit()
+
+        if self.pregenerate and Config.PLAN_CACHE_ENABLED:
+            plan_ids, run.tokens_used = await self.pregenerate_plans(db, [goal for goal, _ in goals])
+            run.plan_ids = json.dumps(plan_ids)
+        run.status = "finished"
+        run.finished_at = datetime.utcnow()
+        await db.commit()
+        print(f"🔥 Cache warmer: {run.tool_refreshes} tool results refreshed for {len(places)} locations, "
+              f"{len(json.loads(run.plan_ids))} plans pre-generated with {run.tokens_used} tokens")
+
+    async def refresh_tools(self, locations: List[str]) -> int:
+        """Re-fetch search and weather results for each location; returns how many were stored"""
+        agent = self.agent_factory()
+        semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_TOOL_CALLS)
+
+        async def refresh(key: str, call: Callable[[], Awaitable[str]]) -> bool:
+            async with semaphore:
+                result = await call()
+            # Tools only cache successful results
+            return self.tool_cache.memory.get(key) == result
+
+        calls = []
+        for location in locations:
+            calls.append(refresh(
+                ToolResultCache.make_key("web_search", query=location, num_results=SEARCH_RESULTS),
+                lambda location=location: agent.web_search_async(location, SEARCH_RESULTS, refresh=True)
+            ))
+            if Config.OPENWEATHER_API_KEY:
+                calls.append(refresh(
+                    ToolResultCache.make_key("get_weather", location=location),
+                    lambda location=location: agent.get_weather_async(location, refresh=True)
+                ))
+        refreshed = sum(await asyncio.gather(*calls))
+        WARMER_ITEMS.inc(refreshed, kind="tool_result")
+        return refreshed
+
+    async def pregenerate_plans(self, db: AsyncSession, goals: List[str]) -> Tuple[List[int], int]:
+        """Store plans for goals without one that outlives the next pass; returns plan ids and tokens used"""
+        # A plan cached now that expires before the next pass would leave a cold gap
+        fresh_after = datetime.utcnow() - timedelta(seconds=max(Config.PLAN_CACHE_TTL - self.interval, 0))
+        plan_ids, tokens_used = [], 0
+        for goal in goals:
+            remaining = self.token_budget - tokens_used
+            if remaining <= 0:
+                break
+            fresh = await db.scalar(
+                select(PlanCacheEntry.id)
+                .where(PlanCacheEntry.normalized_goal == normalize_goal(goal), PlanCacheEntry.created_at >= fresh_after)
+                .limit(1)
+            )
+            if fresh is not None:
+                continue
+            # The agent's budget stops further tool rounds, so a plan may overshoot what is left a little
+            plan, tokens = await self.generate_plan(goal, min(remaining, Config.AGENT_TOKEN_BUDGET or remaining))
+            tokens_used += tokens
+            WARMER_ITEMS.inc(tokens, kind="tokens")
+            if plan is not None:
+                plan_ids.append(plan.id)
+                WARMER_ITEMS.inc(kind="plan")
+        return plan_ids, tokens_used
+
+    async def _track(self, db: AsyncSession):
+        """Count hits on the tool results and plans prepared by passes that are still fresh"""
+        since = datetime.utcnow() - timedelta(seconds=max(Config.PLAN_CACHE_TTL, Config.SEARCH_CACHE_TTL, Config.WEATHER_CACHE_TTL))
+        runs = (await db.execute(
+            select(WarmerRun)
+            .where(WarmerRun.status == "finished", WarmerRun.started_at >= since)
+            .order_by(WarmerRun.id)
+        )).scalars().all()
+
+        tool_keys, plan_ids = set(), set()
+        for run in runs:
+            for location in json.loads(run.locations):
+                tool_keys.add(ToolResultCache.make_key("web_search", query=location, num_results=SEARCH_RESULTS))
+                tool_keys.add(ToolResultCache.make_key("get_weather", location=location))
+            plan_ids.update(json.loads(run.plan_ids))
+        self.tool_cache.mark_warmed(tool_keys)
+        self.plan_cache.mark_warmed(plan_ids)
+        if runs:
+            latest = runs[-1]
+            self.last_run = {
+                "started_at": latest.started_at.isoformat(),
+                "finished_at": latest.finished_at.isoformat() if latest.finished_at else None,
+                "goals": latest.goals,
+                "locations": len(json.loads(latest.locations)),
+                "tool_refreshes": latest.tool_refreshes,
+                "plans_generated": len(json.loads(latest.plan_ids)),
+                "tokens_used": latest.tokens_used
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Latest pass, plus hits in this process on what recent passes prepared"""
+        return {
+            "enabled": self._task is not None,
+            "last_run": self.last_run,
+            "warmed_tool_results": len(self.tool_cache.warmed_keys),
+            "warmed_plans": len(self.plan_cache.warmed_plan_ids),
+            "tool_hits": self.tool_cache.warmed_hits,
+            "plan_hits": self.plan_cache.warmed_hits
+        }
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Compression of stored plan text and of API responses
+
+Plan text is stored as a two-byte header followed by zlib data, or zstd
+data when PLAN_COMPRESSION=zstd and the zstandard package is installed.
+Rows written before compression hold plain text and are read back as-is.
+
+Run directly to compress the plans already in the database:
+    python compression.py
+"""
+import zlib
+from typing import Optional, Union
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import Config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compressed values start with a NUL byte, which plan text never does
+ZLIB_HEADER = b"\x00Z"
+ZSTD_HEADER = b"\x00S"
+
+# Streams are passed through untouched so tokens and batch results are not held back
+UNCOMPRESSED_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def compress_text(text: str, codec: str = None, level: int = None) -> bytes:
+    """Encode plan text for storage with the configured codec"""
+    codec = codec or Config.PLAN_COMPRESSION
+    level = Config.PLAN_COMPRESSION_LEVEL if level is None else level
+    data = text.encode("utf-8")
+    if codec == "zstd" and zstandard is not None:
+        return ZSTD_HEADER + zstandard.ZstdCompressor(level=level).compress(data)
+    if codec in ("zlib", "zstd"):
+        return ZLIB_HEADER + zlib.compress(data, level)
+    return data
+
+
+def decompress_text(value: Union[str, bytes, memoryview, None]) -> Optional[str]:
+    """Decode a stored plan, whether compressed, plain bytes or legacy text"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(ZLIB_HEADER):
+        return zlib.decompress(value[2:]).decode("utf-8")
+    if value.startswith(ZSTD_HEADER):
+        if zstandard is None:
+            raise RuntimeError("Plan is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(value[2:]).decode("utf-8")
+    return value.decode("utf-8")
+
+
+def is_compressed(value: Union[str, bytes, memoryview, None]) -> bool:
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:2]) in (ZLIB_HEADER, ZSTD_HEADER)
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Best response encoding the client accepts: br when brotli is installed, else gzip"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _StreamCompressor:
+    """Incremental gzip or brotli encoder; every chunk is flushed so streamed bodies stay live"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=5)
+        else:
+            # wbits=31 writes the gzip container rather than a bare zlib stream
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if last else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def weaken_for_encoding(headers: MutableHeaders):
+    """Mark a response as varying by Accept-Encoding; the encoded bytes differ from the
+    identity ones, so a strong validator becomes weak"""
+    headers.add_vary_header("Accept-Encoding")
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies with gzip or brotli, per Accept-Encoding
+
+    Bodies under minimum_size, already-encoded responses, and event or
+    NDJSON streams are sent unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = Config.RESPONSE_COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+        pending = b""
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough, pending
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                passthrough = "content-encoding" in headers or media_type in UNCOMPRESSED_MEDIA_TYPES
+                if message["status"] == 304:
+                    # A 304 stands in for the encoded 200, so it carries the same validator and Vary
+                    passthrough = True
+                    weaken_for_encoding(MutableHeaders(raw=message["headers"]))
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                # Hold the start of the body until it is clearly big enough to be worth compressing
+                pending += body
+                if more_body and len(pending) < self.minimum_size:
+                    return
+                body, pending = pending, b""
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = _StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                weaken_for_encoding(headers)
+                del headers["Content-Length"]
+                if not more_body:
+                    body = compressor.chunk(body, last=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+            await send({"type": "http.response.body", "body": compressor.chunk(body, last=not more_body), "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def compress_existing_plans(bind, batch_size: int = 500) -> int:
+    """Compress plans still stored as plain text; returns the number of rows rewritten"""
+    from sqlalchemy import text
+
+    rewritten = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, plan_content FROM plans WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size}
+            ).all()
+            if not rows:
+                return rewritten
+            last_id = rows[-1].id
+            updates = [
+                {"id": row.id, "content": compress_text(decompress_text(row.plan_content))}
+                for row in rows if not is_compressed(row.plan_content)
+            ]
+            if updates:
+                conn.execute(text("UPDATE plans SET plan_content = :content WHERE id = :id"), updates)
+                rewritten += len(updates)
+
+
+def main():
+    from sqlalchemy import text
+    from database import engine, create_tables, is_sqlite
+
+    create_tables()
+    rewritten = compress_existing_plans(engine)
+    print(f"✅ Compressed {rewritten} plans with {Config.PLAN_COMPRESSION}")
+    if rewritten and is_sqlite(Config.DATABASE_URL):
+        # Freed pages only shrink the file after a VACUUM
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("✅ Database file compacted")
+
+
+if __name__ == "__main__":
+    main()
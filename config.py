@@ -6,6 +6,125 @@ load_dotenv()
 class Config:
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
-    DATABASE_URL = "sqlite:///./plans.db"
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./plans.db')
+    # Async driver URL; derived from DATABASE_URL (aiosqlite / asyncpg) when unset
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', '')
     GROQ_MODEL = "llama-3.1-8b-instant"
+    # Upstream endpoints; override to point the agent at a local stand-in (see benchmark.py)
+    GROQ_BASE_URL = os.getenv('GROQ_BASE_URL', 'https://api.groq.com/openai/v1')
+    SEARCH_API_URL = os.getenv('SEARCH_API_URL', 'https://api.duckduckgo.com/')
+    WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
     DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
+
+    # Tool calls from one assistant turn run concurrently
+    TOOL_CALL_TIMEOUT = float(os.getenv('TOOL_CALL_TIMEOUT', '15'))
+    MAX_CONCURRENT_TOOL_CALLS = int(os.getenv('MAX_CONCURRENT_TOOL_CALLS', '6'))
+    # Tool results are deduplicated and trimmed to these estimated token limits before later calls (0 disables)
+    TOOL_CONTEXT_TOKEN_BUDGET = int(os.getenv('TOOL_CONTEXT_TOKEN_BUDGET', '1500'))
+    TOOL_RESULT_MAX_TOKENS = int(os.getenv('TOOL_RESULT_MAX_TOKENS', '400'))
+
+    # Outbound HTTP: pooled keep-alive clients, timeouts and retry/backoff
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+    HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))
+    HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '8'))
+    HTTP_RETRY_AFTER_MAX = float(os.getenv('HTTP_RETRY_AFTER_MAX', '30'))
+
+    # Tool result cache: in-memory LRU, plus a SQLite tier shared across workers when a path is set
+    TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', '1024'))
+    TOOL_CACHE_DB_PATH = os.getenv('TOOL_CACHE_DB_PATH', '')
+    TOOL_CACHE_DB_MAX_ROWS = int(os.getenv('TOOL_CACHE_DB_MAX_ROWS', '10000'))
+    TOOL_CACHE_PURGE_EVERY = int(os.getenv('TOOL_CACHE_PURGE_EVERY', '100'))
+    WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '600'))
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '21600'))
+
+    # Plan cache: answer repeated goals from stored plans instead of calling Groq
+    PLAN_CACHE_ENABLED = os.getenv('PLAN_CACHE_ENABLED', 'True').lower() == 'true'
+    PLAN_CACHE_TTL = int(os.getenv('PLAN_CACHE_TTL', '86400'))
+    PLAN_CACHE_SIMILARITY = float(os.getenv('PLAN_CACHE_SIMILARITY', '0.85'))
+    PLAN_CACHE_INDEX_SIZE = int(os.getenv('PLAN_CACHE_INDEX_SIZE', '10000'))
+    # Concurrent requests for the same normalised goal wait on one generation
+    PLAN_COALESCING_ENABLED = os.getenv('PLAN_COALESCING_ENABLED', 'True').lower() == 'true'
+
+    # History listing
+    PLANS_PAGE_SIZE = int(os.getenv('PLANS_PAGE_SIZE', '20'))
+    PLAN_PREVIEW_CHARS = int(os.getenv('PLAN_PREVIEW_CHARS', '240'))
+    # Plans never change, so single-plan responses may be cached this long; serialised responses kept in memory
+    PLAN_HTTP_MAX_AGE = int(os.getenv('PLAN_HTTP_MAX_AGE', '31536000'))
+    PLAN_RESPONSE_CACHE_SIZE = int(os.getenv('PLAN_RESPONSE_CACHE_SIZE', '1024'))
+
+    # Plan text is stored compressed (zlib, zstd if zstandard is installed, or none); API responses use gzip or brotli
+    PLAN_COMPRESSION = os.getenv('PLAN_COMPRESSION', 'zlib').lower()
+    PLAN_COMPRESSION_LEVEL = int(os.getenv('PLAN_COMPRESSION_LEVEL', '6'))
+    RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'True').lower() == 'true'
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+
+    # Database pool (server databases) and SQLite connection tuning
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', str(64 * 1024)))
+
+    # Background plan jobs (POST /api/jobs)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_QUEUE_MAX_DEPTH = int(os.getenv('JOB_QUEUE_MAX_DEPTH', '100'))
+    JOB_DRAIN_TIMEOUT = float(os.getenv('JOB_DRAIN_TIMEOUT', '30'))
+
+    # Agent loop limits; the deadline and token budget stop further tool rounds (0 disables them)
+    AGENT_MAX_ROUNDS = int(os.getenv('AGENT_MAX_ROUNDS', '3'))
+    AGENT_DEADLINE_SECONDS = float(os.getenv('AGENT_DEADLINE_SECONDS', '45'))
+    AGENT_TOKEN_BUDGET = int(os.getenv('AGENT_TOKEN_BUDGET', '12000'))
+
+    # Batch planning (POST /api/plans/batch and batch.py)
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+    BATCH_COMMIT_SIZE = int(os.getenv('BATCH_COMMIT_SIZE', '50'))
+    BATCH_FLUSH_SECONDS = float(os.getenv('BATCH_FLUSH_SECONDS', '0.5'))
+    BATCH_MAX_GOALS = int(os.getenv('BATCH_MAX_GOALS', '5000'))
+
+    # Add a Server-Timing header with per-span durations to every response
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING', 'False').lower() == 'true'
+
+    # Client-side Groq rate limits (0 disables); set a DB path to share the budget across workers
+    GROQ_RPM = int(os.getenv('GROQ_RPM', '30'))
+    GROQ_TPM = int(os.getenv('GROQ_TPM', '0'))
+    GROQ_RATE_LIMIT_DB_PATH = os.getenv('GROQ_RATE_LIMIT_DB_PATH', '')
+    GROQ_RATE_LIMIT_MAX_WAIT = float(os.getenv('GROQ_RATE_LIMIT_MAX_WAIT', '60'))
+    GROQ_EXPECTED_COMPLETION_TOKENS = int(os.getenv('GROQ_EXPECTED_COMPLETION_TOKENS', '700'))
+
+    # LLM routing: LLM_ENDPOINTS is an ordered JSON list of OpenAI-compatible endpoints
+    # ({"name", "base_url", "model", "api_key_env"}) replacing the Groq default;
+    # LLM_FALLBACK_MODELS adds comma-separated Groq models after GROQ_MODEL
+    LLM_ENDPOINTS = os.getenv('LLM_ENDPOINTS', '')
+    LLM_FALLBACK_MODELS = os.getenv('LLM_FALLBACK_MODELS', '')
+    # A hedged copy goes to the next endpoint once a call outlasts the first endpoint's p95 latency
+    LLM_HEDGING = os.getenv('LLM_HEDGING', 'True').lower() == 'true'
+    LLM_HEDGE_QUANTILE = float(os.getenv('LLM_HEDGE_QUANTILE', '0.95'))
+    LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', '5'))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.5'))
+    LLM_LATENCY_WINDOW = int(os.getenv('LLM_LATENCY_WINDOW', '200'))
+    LLM_MIN_SAMPLES = int(os.getenv('LLM_MIN_SAMPLES', '20'))
+    LLM_ENDPOINT_COOLDOWN = float(os.getenv('LLM_ENDPOINT_COOLDOWN', '30'))
+    # Share of calls sent to the runner-up first, so its latency stays known
+    LLM_EXPLORE_RATE = float(os.getenv('LLM_EXPLORE_RATE', '0.05'))
+
+    # Cache warmer: every CACHE_WARMER_INTERVAL seconds, inside the optional off-peak window (local "HH:MM-HH:MM"),
+    # refresh tool results for the most planned locations and, if enabled, pre-generate plans for the
+    # most frequent goals until CACHE_WARMER_TOKEN_BUDGET Groq tokens are spent
+    CACHE_WARMER_ENABLED = os.getenv('CACHE_WARMER_ENABLED', 'False').lower() == 'true'
+    CACHE_WARMER_INTERVAL = float(os.getenv('CACHE_WARMER_INTERVAL', '3600'))
+    CACHE_WARMER_WINDOW = os.getenv('CACHE_WARMER_WINDOW', '')
+    CACHE_WARMER_LOOKBACK_DAYS = int(os.getenv('CACHE_WARMER_LOOKBACK_DAYS', '7'))
+    CACHE_WARMER_SCAN_LIMIT = int(os.getenv('CACHE_WARMER_SCAN_LIMIT', '5000'))
+    CACHE_WARMER_TOP_GOALS = int(os.getenv('CACHE_WARMER_TOP_GOALS', '20'))
+    CACHE_WARMER_TOP_LOCATIONS = int(os.getenv('CACHE_WARMER_TOP_LOCATIONS', '20'))
+    CACHE_WARMER_PREGENERATE = os.getenv('CACHE_WARMER_PREGENERATE', 'False').lower() == 'true'
+    CACHE_WARMER_TOKEN_BUDGET = int(os.getenv('CACHE_WARMER_TOKEN_BUDGET', '50000'))
+
+    # Production launcher (python run.py --prod): run.py sets SCHEMA_READY after creating tables before forking
+    SCHEMA_READY = os.getenv('SCHEMA_READY', 'False').lower() == 'true'
+    GRACEFUL_SHUTDOWN_TIMEOUT = float(os.getenv('GRACEFUL_SHUTDOWN_TIMEOUT', '60'))
@@ -0,0 +1,96 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+from config import Config
+
+TRIM_MARKER = " …[trimmed]"
+
+
+def approx_tokens(text) -> int:
+    """Cheap token estimate for text or encoded bytes: about four characters per token for English"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _line_key(line: str) -> str:
+    return re.sub(r"\s+", " ", line.strip().lower())
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, preferring a line or sentence boundary"""
+    if approx_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * 4 - len(TRIM_MARKER))
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + TRIM_MARKER
+
+
+def _fair_shares(sizes: List[int], budget: int) -> List[int]:
+    """Split a token budget so small results stay whole and large ones share the rest evenly"""
+    shares = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        index = pending.pop(0)
+        shares[index] = min(sizes[index], share)
+        remaining -= shares[index]
+    return shares
+
+
+def trim_tool_results(messages: List[Dict[str, Any]], budget_tokens: int = None, max_result_tokens: int = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Shrink the tool messages of a conversation to fit a token budget
+
+    Repeated results and lines already seen in an earlier result are
+    dropped, each result is capped at max_result_tokens, and if the total
+    is still over budget every result is cut back to a fair share, keeping
+    its leading lines. Returns the new message list and the tokens saved.
+    """
+    budget_tokens = Config.TOOL_CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    max_result_tokens = Config.TOOL_RESULT_MAX_TOKENS if max_result_tokens is None else max_result_tokens
+    tool_indexes = [i for i, message in enumerate(messages) if message.get("role") == "tool"]
+    if not tool_indexes or not (budget_tokens or max_result_tokens):
+        return messages, 0
+
+    before = sum(approx_tokens(messages[i]["content"]) for i in tool_indexes)
+    seen_results = {}
+    seen_lines = set()
+    contents = {}
+    for i in tool_indexes:
+        message = messages[i]
+        content = message["content"]
+        result_key = (message.get("name"), _line_key(content))
+        if result_key in seen_results:
+            contents[i] = f"Same result as the earlier {message.get('name')} call."
+            continue
+        seen_results[result_key] = i
+
+        lines = []
+        for line in content.splitlines():
+            key = _line_key(line)
+            if key and key in seen_lines:
+                continue
+            seen_lines.add(key)
+            lines.append(line)
+        content = "\n".join(lines) or content
+        if max_result_tokens:
+            content = truncate_to_tokens(content, max_result_tokens)
+        contents[i] = content
+
+    if budget_tokens:
+        sizes = [approx_tokens(contents[i]) for i in tool_indexes]
+        if sum(sizes) > budget_tokens:
+            for i, share in zip(tool_indexes, _fair_shares(sizes, budget_tokens)):
+                contents[i] = truncate_to_tokens(contents[i], max(share, 1))
+
+    after = sum(approx_tokens(content) for content in contents.values())
+    if after >= before:
+        return messages, 0
+
+    trimmed = list(messages)
+    for i, content in contents.items():
+        if content != messages[i]["content"]:
+            trimmed[i] = {**messages[i], "content": content}
+    return trimmed, before - after
@@ -1,27 +1,212 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, LargeBinary, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, validates
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 from config import Config
+from compression import compress_text, decompress_text
 
 Base = declarative_base()
 
+class CompressedText(TypeDecorator):
+    """Text stored compressed (see compression.py); plain text from older rows is read back unchanged"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
 class Plan(Base):
     __tablename__ = "plans"
     
     id = Column(Integer, primary_key=True, index=True)
     goal = Column(Text, nullable=False)
-    plan_content = Column(Text, nullable=False)
+    plan_content = Column(CompressedText, nullable=False)
+    # Start and length of the plan, so the history list never decompresses plan_content
+    preview = Column(Text, nullable=True)
+    content_chars = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Backs keyset pagination of the history, newest first
+    __table_args__ = (Index("ix_plans_created_at_id", "created_at", "id"),)
+
+    @validates("plan_content")
+    def _set_preview(self, key, value):
+        self.preview = value[:Config.PLAN_PREVIEW_CHARS] if value is not None else None
+        self.content_chars = len(value) if value is not None else None
+        return value
+
+class PlanCacheEntry(Base):
+    """Normalised goal -> plan index used to answer repeated goals without the LLM"""
+    __tablename__ = "plan_cache"
+
+    id = Column(Integer, primary_key=True)
+    normalized_goal = Column(Text, nullable=False, index=True)
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class PlanJob(Base):
+    """Background plan generation job, polled via /api/jobs/{id}"""
+    __tablename__ = "plan_jobs"
+
+    id = Column(String(32), primary_key=True)
+    goal = Column(Text, nullable=False)
+    bypass_cache = Column(Boolean, nullable=False, default=False)
+    status = Column(String(16), nullable=False, default="queued", index=True)  # queued | running | succeeded | failed
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class WarmerRun(Base):
+    """One cache warmer pass; the latest claims the interval for all workers and lists what it warmed"""
+    __tablename__ = "warmer_runs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(16), nullable=False, default="running")  # running | finished | failed
+    goals = Column(Integer, nullable=False, default=0)
+    locations = Column(Text, nullable=False, default="[]")  # JSON list of locations whose tool results were refreshed
+    plan_ids = Column(Text, nullable=False, default="[]")  # JSON list of pre-generated plan ids
+    tool_refreshes = Column(Integer, nullable=False, default=0)
+    tokens_used = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# Full-text index over plans, kept in sync by triggers (SQLite FTS5);
+# plan_text() is registered on every connection to decompress plan_content
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS plans_fts
+       USING fts5(goal, plan_content, tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS plans_fts_insert AFTER INSERT ON plans BEGIN
+         INSERT INTO plans_fts(rowid, goal, plan_content) VALUES (new.id, new.goal, plan_text(new.plan_content));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS plans_fts_delete AFTER DELETE ON plans BEGIN
+         DELETE FROM plans_fts WHERE rowid = old.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS plans_fts_update AFTER UPDATE OF goal, plan_content ON plans BEGIN
+         DELETE FROM plans_fts WHERE rowid = old.id;
+         INSERT INTO plans_fts(rowid, goal, plan_content) VALUES (new.id, new.goal, plan_text(new.plan_content));
+       END"""
+]
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver"""
+    if Config.ASYNC_DATABASE_URL:
+        return Config.ASYNC_DATABASE_URL
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+def engine_options(url: str, for_async: bool = False) -> dict:
+    """Pool settings for the configured backend"""
+    options = {
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+    }
+    if is_sqlite(url):
+        # Connections are handed between the threadpool and the event loop
+        if for_async:
+            # aiosqlite defaults to NullPool; reuse connections instead of opening one per session
+            options["poolclass"] = AsyncAdaptedQueuePool
+        else:
+            options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_recycle"] = Config.DB_POOL_RECYCLE
+        options["pool_pre_ping"] = True
+    return options
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Per-connection SQLite tuning: WAL lets readers run alongside a writer, and
+    busy_timeout makes concurrent writers from several workers wait instead of failing.
+    Also registers plan_text(), which the search triggers use to read compressed plans"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+    dbapi_connection.create_function("plan_text", 1, decompress_text, deterministic=True)
 
 # Database setup
-engine = create_engine(Config.DATABASE_URL)
+engine = create_engine(Config.DATABASE_URL, **engine_options(Config.DATABASE_URL))
+if is_sqlite(Config.DATABASE_URL):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request path, so queries and commits yield to the event loop
+ASYNC_DATABASE_URL = async_database_url(Config.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, for_async=True))
+if is_sqlite(ASYNC_DATABASE_URL):
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def create_search_index(bind=engine) -> bool:
+    """Create the FTS table and triggers; returns True if the table is new"""
+    is_new = not inspect(bind).has_table("plans_fts")
+    with bind.begin() as conn:
+        for statement in SEARCH_INDEX_DDL:
+            conn.execute(text(statement))
+    return is_new
+
+def upgrade_plan_storage(bind=engine):
+    """Migrate a plans table from before compression: add the preview columns, make
+    plan_content binary on Postgres, and replace FTS triggers that index raw plan_content"""
+    columns = {column["name"]: column for column in inspect(bind).get_columns("plans")}
+    sqlite = bind.dialect.name == "sqlite"
+    with bind.begin() as conn:
+        if "preview" not in columns:
+            content = "plan_text(plan_content)" if sqlite else "plan_content"
+            conn.execute(text("ALTER TABLE plans ADD COLUMN preview TEXT"))
+            conn.execute(text("ALTER TABLE plans ADD COLUMN content_chars INTEGER"))
+            conn.execute(
+                text(f"UPDATE plans SET preview = substr({content}, 1, :chars), content_chars = length({content})"),
+                {"chars": Config.PLAN_PREVIEW_CHARS}
+            )
+        if not sqlite and not isinstance(columns["plan_content"]["type"], LargeBinary):
+            conn.execute(text(
+                "ALTER TABLE plans ALTER COLUMN plan_content TYPE BYTEA USING convert_to(plan_content, 'UTF8')"
+            ))
+        if sqlite:
+            stale = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'plans_fts_%' "
+                "AND sql LIKE '%new.plan_content%' AND sql NOT LIKE '%plan_text(%'"
+            )).scalars().all()
+            for name in stale:
+                conn.execute(text(f'DROP TRIGGER "{name}"'))
+
 def create_tables():
     """Create database tables if they don't exist"""
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all skips indexes on tables that already exist
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        upgrade_plan_storage()
+        if is_sqlite(Config.DATABASE_URL) and create_search_index():
+            with engine.connect() as conn:
+                has_plans = conn.execute(text("SELECT 1 FROM plans LIMIT 1")).first() is not None
+            if has_plans:
+                print("ℹ️  Search index created; run `python search.py` to index existing plans")
         print("✅ Database tables created/verified successfully")
     except Exception as e:
         print(f"❌ Error creating database tables: {e}")
@@ -33,3 +218,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,116 @@
+import random
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING
+
+import httpx
+
+from config import Config
+
+# requests is only needed by the sync code path, so it is imported on first use
+if TYPE_CHECKING:
+    import requests
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before retry number `attempt` (0-based)"""
+    if retry_after is not None:
+        return min(retry_after, Config.HTTP_RETRY_AFTER_MAX)
+    # Full jitter keeps retrying workers from synchronising
+    ceiling = min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _retry_after(response) -> Optional[float]:
+    if response.status_code not in (429, 503):
+        return None
+    return parse_retry_after(response.headers.get("retry-after"))
+
+
+def create_session(pool_size: int = None) -> "requests.Session":
+    """Keep-alive session with a bounded connection pool"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = pool_size or Config.HTTP_POOL_SIZE
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_async_client(pool_size: int = None) -> httpx.AsyncClient:
+    """Keep-alive async client with a bounded connection pool"""
+    pool_size = pool_size or Config.HTTP_POOL_SIZE
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(Config.HTTP_READ_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    )
+
+
+def request_with_retry(session: "requests.Session", method: str, url: str, max_retries: int = None, **kwargs) -> "requests.Response":
+    """Send a request, retrying connection failures and 429/5xx responses with backoff"""
+    import requests
+
+    kwargs.setdefault("timeout", (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT))
+    max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            time.sleep(backoff_delay(attempt, _retry_after(response)))
+            continue
+        return response
+
+
+async def request_with_retry_async(client: httpx.AsyncClient, method: str, url: str, stream: bool = False, max_retries: int = None, **kwargs) -> httpx.Response:
+    """Non-blocking variant of request_with_retry
+
+    With stream=True the body is left unread and the caller must close the
+    response; only the status line is retried.
+    """
+    max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(max_retries + 1):
+        try:
+            request = client.build_request(method, url, **kwargs)
+            response = await client.send(request, stream=stream)
+        except (httpx.TransportError, httpx.TimeoutException):
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            await response.aclose()
+            await asyncio.sleep(backoff_delay(attempt, _retry_after(response)))
+            continue
+        return response
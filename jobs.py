@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import AsyncSessionLocal, Plan, PlanJob, engine
+
+SHUTDOWN_ERROR = "Server shut down before the job finished"
+UNFINISHED_STATUSES = ("queued", "running")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at its maximum depth"""
+
+
+# Coroutine that generates and stores a plan for a job, using sessions of its own:
+# (goal, bypass_cache) -> (stored plan, whether generation succeeded)
+JobHandler = Callable[[str, bool], Awaitable[Tuple[Plan, bool]]]
+
+
+class JobQueue:
+    """Bounded in-process queue of plan generation jobs, drained by a fixed pool of asyncio workers
+
+    Job state lives in the plan_jobs table so any worker process can answer
+    status polls. The queue itself is per process: when it is full, submit()
+    raises QueueFullError and the caller should answer 429.
+    """
+
+    def __init__(self, handler: JobHandler, workers: int = None, max_depth: int = None):
+        self.handler = handler
+        self.worker_count = workers or Config.JOB_WORKERS
+        self.max_depth = max_depth or Config.JOB_QUEUE_MAX_DEPTH
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Set[str] = set()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"plan-job-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self, drain_timeout: float = None):
+        """Let queued and running jobs finish for up to drain_timeout seconds, then cancel the rest"""
+        if not self._workers:
+            return
+        drain_timeout = Config.JOB_DRAIN_TIMEOUT if drain_timeout is None else drain_timeout
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Cancelled and never-started jobs would otherwise read as queued/running forever
+        abandoned = set(self._running)
+        while not self._queue.empty():
+            abandoned.add(self._queue.get_nowait())
+            self._queue.task_done()
+        self._running.clear()
+        if abandoned:
+            await self._fail(abandoned, SHUTDOWN_ERROR)
+
+    async def _fail(self, job_ids: Iterable[str], error: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(PlanJob)
+                .where(PlanJob.id.in_(list(job_ids)), PlanJob.status.in_(UNFINISHED_STATUSES))
+                .values(status="failed", error=error, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    async def submit(self, db: AsyncSession, goal: str, bypass_cache: bool = False) -> PlanJob:
+        """Record a queued job and hand it to the workers"""
+        if self._queue is None or self._queue.full():
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+
+        job = PlanJob(id=uuid.uuid4().hex, goal=goal, bypass_cache=bypass_cache, status="queued")
+        db.add(job)
+        await db.commit()
+        # A worker may have freed a slot or another request taken one while we committed
+        try:
+            self._queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            job.status = "failed"
+            job.error = "Job queue is full"
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._running.add(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"❌ Plan job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+            # Skipped on cancellation, so stop() can mark the job failed
+            self._running.discard(job_id)
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(PlanJob, job_id)
+            if job is None:
+                return
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            # The commit hands the connection back to the pool for the length of the generation
+            await db.commit()
+
+            try:
+                plan, succeeded = await self.handler(job.goal, job.bypass_cache)
+                job.plan_id = plan.id
+                job.status = "succeeded" if succeeded else "failed"
+                if not succeeded:
+                    job.error = plan.plan_content
+            except Exception as e:
+                await db.rollback()
+                job = await db.get(PlanJob, job_id)
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+
+
+def fail_interrupted_jobs(bind=engine) -> int:
+    """Mark jobs left queued or running by a previous server process as failed
+
+    Call only while no worker is serving, i.e. before the app starts;
+    returns the number of jobs marked.
+    """
+    with bind.begin() as conn:
+        return conn.execute(
+            update(PlanJob)
+            .where(PlanJob.status.in_(UNFINISHED_STATUSES))
+            .values(status="failed", error=SHUTDOWN_ERROR, finished_at=datetime.utcnow())
+        ).rowcount
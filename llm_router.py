@@ -0,0 +1,394 @@
+"""
+Routing of chat completion requests across an ordered list of OpenAI-compatible endpoints
+
+Calls go to the endpoint with the best recent latency; until an endpoint has
+LLM_MIN_SAMPLES latencies, the configured order decides, and a small share of
+calls tries the runner-up first so its latency stays known. When an async call
+outlasts the first endpoint's p95 latency, a hedged copy goes to the next
+endpoint and whichever answers first is used. Errors and timeouts fail over
+down the list, and failing endpoints sit out LLM_ENDPOINT_COOLDOWN seconds.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from config import Config
+from http_client import request_with_retry, request_with_retry_async
+from metrics import span, GROQ_REQUESTS, LLM_LATENCY, LLM_HEDGES, LLM_FAILOVERS
+from rate_limiter import GroqRateLimiter, RateLimitTimeout, get_rate_limiter
+
+# Weight of the newest latency in an endpoint's moving average
+EWMA_ALPHA = 0.2
+
+
+class LLMRequestError(Exception):
+    """Non-200 answer from an LLM endpoint"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Endpoint:
+    """One OpenAI-compatible chat completions endpoint and its recent latency, per request kind"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str] = None,
+                 upstream: str = None, rate_limiter: Optional[GroqRateLimiter] = None, window: int = None):
+        self.name = name
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.model = model
+        # Endpoints on the same host share one pooled client
+        self.upstream = upstream or name
+        self.rate_limiter = rate_limiter
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self._model_json = json.dumps(model).encode()
+        self._window = window or Config.LLM_LATENCY_WINDOW
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._ewma: Dict[str, float] = {}
+        self.cooldown_until = 0.0
+        self.successes = 0
+        self.failures = 0
+
+    def body(self, body: bytes) -> bytes:
+        """Add this endpoint's model to a request serialised without one"""
+        return b'{"model": ' + self._model_json + b", " + body[1:]
+
+    def record_latency(self, kind: str, seconds: float):
+        self.successes += 1
+        self._latencies.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+        self.record_slowness(kind, seconds)
+
+    def record_slowness(self, kind: str, seconds: float):
+        """Feed the moving average only, e.g. with the age of a call abandoned for a faster copy"""
+        previous = self._ewma.get(kind)
+        self._ewma[kind] = seconds if previous is None else previous + EWMA_ALPHA * (seconds - previous)
+
+    def record_failure(self, cooldown: float):
+        self.failures += 1
+        if cooldown:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def quantile(self, kind: str, q: float, min_samples: int) -> Optional[float]:
+        latencies = self._latencies.get(kind)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def typical_latency(self, kind: str, min_samples: int) -> Optional[float]:
+        latencies = self._latencies.get(kind)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return self._ewma.get(kind)
+
+    def cooling_down(self, now: float = None) -> bool:
+        return (now or time.monotonic()) < self.cooldown_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "successes": self.successes,
+            "failures": self.failures,
+            "cooling_down": self.cooling_down(),
+            "latency_ms": {
+                kind: {
+                    "ewma": round(self._ewma[kind] * 1000, 1),
+                    "p95": round(self.quantile(kind, 0.95, 1) * 1000, 1),
+                    "samples": len(latencies)
+                }
+                for kind, latencies in self._latencies.items() if latencies
+            }
+        }
+
+
+def endpoints_from_config(rate_limiter: Optional[GroqRateLimiter] = None) -> List[Endpoint]:
+    """Endpoints from LLM_ENDPOINTS, or Groq with GROQ_MODEL followed by LLM_FALLBACK_MODELS"""
+    rate_limiter = rate_limiter or get_rate_limiter()
+    if Config.LLM_ENDPOINTS:
+        specs = json.loads(Config.LLM_ENDPOINTS)
+    else:
+        models = [Config.GROQ_MODEL] + [model.strip() for model in Config.LLM_FALLBACK_MODELS.split(",") if model.strip()]
+        specs = [
+            {"name": "groq" if index == 0 else f"groq:{model}", "base_url": Config.GROQ_BASE_URL,
+             "model": model, "api_key_env": "GROQ_API_KEY"}
+            for index, model in enumerate(models)
+        ]
+
+    groq_base = Config.GROQ_BASE_URL.rstrip("/")
+    endpoints = []
+    for spec in specs:
+        on_groq = spec["base_url"].rstrip("/") == groq_base
+        name = spec.get("name") or spec["model"]
+        endpoints.append(Endpoint(
+            name=name,
+            base_url=spec["base_url"],
+            model=spec["model"],
+            api_key=os.getenv(spec["api_key_env"]) if spec.get("api_key_env") else spec.get("api_key"),
+            # Every Groq model shares one connection pool and the client-side Groq rate limit
+            upstream="groq" if on_groq else name,
+            rate_limiter=rate_limiter if on_groq else None
+        ))
+    return endpoints
+
+
+class LLMRouter:
+    """Sends chat completion requests to the best available endpoint, with hedging and failover
+
+    Request bodies are serialised without a model; each endpoint adds its own.
+    `client_for` / `session_for` callables map an endpoint's upstream name to
+    a pooled httpx client or requests session owned by the caller.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], hedging: bool = None, explore_rate: float = None):
+        if not endpoints:
+            raise ValueError("At least one LLM endpoint is required")
+        self.endpoints = endpoints
+        self.hedging = Config.LLM_HEDGING if hedging is None else hedging
+        self.explore_rate = Config.LLM_EXPLORE_RATE if explore_rate is None else explore_rate
+        self.min_samples = max(1, Config.LLM_MIN_SAMPLES)
+
+    @property
+    def primary(self) -> Endpoint:
+        return self.endpoints[0]
+
+    def ranked(self, kind: str) -> List[Endpoint]:
+        """Healthy endpoints first, then fastest; configured order until latencies are known"""
+        now = time.monotonic()
+        order = {id(endpoint): index for index, endpoint in enumerate(self.endpoints)}
+
+        def key(endpoint: Endpoint):
+            latency = endpoint.typical_latency(kind, self.min_samples)
+            return (endpoint.cooling_down(now), float("inf") if latency is None else latency, order[id(endpoint)])
+
+        ranked = sorted(self.endpoints, key=key)
+        if len(ranked) > 1 and not ranked[1].cooling_down(now) and random.random() < self.explore_rate:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        return ranked
+
+    def hedge_delay(self, endpoint: Endpoint, kind: str) -> float:
+        """How long to wait for an endpoint before sending a hedged copy elsewhere"""
+        latency = endpoint.quantile(kind, Config.LLM_HEDGE_QUANTILE, self.min_samples)
+        return max(Config.LLM_HEDGE_MIN_DELAY, Config.LLM_HEDGE_DELAY if latency is None else latency)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _check_response(self, endpoint: Endpoint, response):
+        """Raise a readable error for a non-200 answer (requests or httpx)"""
+        if response.status_code == 200:
+            return
+        error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+        error = error_data.get('error', {}) if isinstance(error_data, dict) else {}
+        error_msg = error.get('message', response.text)
+        if 'model_decommissioned' in (error.get('code') or ''):
+            raise LLMRequestError(f"Model '{endpoint.model}' has been decommissioned. Please update the configured model. Error: {error_msg}", response.status_code)
+        raise LLMRequestError(f"LLM API error from {endpoint.name}: {response.status_code} - {error_msg}", response.status_code)
+
+    def _record_failure(self, endpoint: Endpoint, error: Exception, failing_over: bool):
+        # Only overload and transport trouble says anything about the endpoint's health
+        status = getattr(error, "status_code", None)
+        endpoint_at_fault = not isinstance(error, RateLimitTimeout) and (status is None or status == 429 or status >= 500)
+        endpoint.record_failure(Config.LLM_ENDPOINT_COOLDOWN if endpoint_at_fault else 0)
+        if failing_over:
+            LLM_FAILOVERS.inc(endpoint=endpoint.name)
+
+    def _record_success(self, endpoint: Endpoint, kind: str, seconds: float):
+        endpoint.record_latency(kind, seconds)
+        LLM_LATENCY.observe(seconds, endpoint=endpoint.name, kind=kind)
+
+    def _settle(self, endpoint: Endpoint, reserved: Optional[int], usage: Optional[Dict[str, Any]]):
+        if endpoint.rate_limiter is not None and reserved is not None:
+            endpoint.rate_limiter.settle(reserved, usage)
+
+    async def _settle_async(self, endpoint: Endpoint, reserved: Optional[int], usage: Optional[Dict[str, Any]]):
+        if endpoint.rate_limiter is not None and reserved is not None:
+            await endpoint.rate_limiter.settle_async(reserved, usage)
+
+    def _retries(self, position: int, candidates: List[Endpoint]) -> Optional[int]:
+        # Retrying the same endpoint only makes sense when there is nowhere else to go
+        return None if position == len(candidates) - 1 else 0
+
+    def complete(self, body: bytes, session_for: Callable[[str], Any], kind: str = "final") -> Dict[str, Any]:
+        """Blocking completion with failover down the ranked endpoints (no hedging)"""
+        candidates = self.ranked(kind)
+        for position, endpoint in enumerate(candidates):
+            last = position == len(candidates) - 1
+            reserved = None
+            try:
+                if endpoint.rate_limiter is not None:
+                    reserved = endpoint.rate_limiter.acquire(body)
+                started = time.monotonic()
+                response = request_with_retry(
+                    session_for(endpoint.upstream), "POST", endpoint.url, max_retries=self._retries(position, candidates),
+                    headers=endpoint.headers, data=endpoint.body(body)
+                )
+                GROQ_REQUESTS.inc(endpoint=endpoint.name, status=response.status_code)
+                self._check_response(endpoint, response)
+                response_data = response.json()
+            except Exception as e:
+                self._record_failure(endpoint, e, failing_over=not last)
+                if last:
+                    raise
+                continue
+            self._record_success(endpoint, kind, time.monotonic() - started)
+            self._settle(endpoint, reserved, response_data.get("usage"))
+            return response_data
+
+    async def _attempt(self, endpoint: Endpoint, body: bytes, client_for: Callable[[str], Any], max_retries: Optional[int]) -> Dict[str, Any]:
+        response = await request_with_retry_async(
+            client_for(endpoint.upstream), "POST", endpoint.url, max_retries=max_retries,
+            headers=endpoint.headers, content=endpoint.body(body)
+        )
+        GROQ_REQUESTS.inc(endpoint=endpoint.name, status=response.status_code)
+        self._check_response(endpoint, response)
+        return response.json()
+
+    async def complete_async(self, body: bytes, client_for: Callable[[str], Any], kind: str = "final") -> Dict[str, Any]:
+        """Non-blocking completion; hedges a slow call to the next endpoint and fails over on errors"""
+        candidates = self.ranked(kind)
+        # task -> (endpoint, reserved tokens, start time, is the hedged copy)
+        pending: Dict[asyncio.Task, tuple] = {}
+        next_index = 0
+        hedge_tried = hedged = False
+        last_error: Optional[Exception] = None
+
+        async def launch(hedge: bool) -> bool:
+            nonlocal next_index, last_error
+            while next_index < len(candidates):
+                position = next_index
+                endpoint = candidates[position]
+                next_index += 1
+                reserved = None
+                if endpoint.rate_limiter is not None:
+                    if hedge:
+                        # A hedge is optional; never queue for it
+                        reserved = await endpoint.rate_limiter.try_acquire_async(body)
+                        if reserved is None:
+                            # Keep the endpoint for failover if the primary fails
+                            next_index = position
+                            return False
+                    else:
+                        try:
+                            reserved = await endpoint.rate_limiter.acquire_async(body)
+                        except RateLimitTimeout as e:
+                            last_error = e
+                            continue
+                task = asyncio.create_task(self._attempt(endpoint, body, client_for, self._retries(position, candidates)))
+                pending[task] = (endpoint, reserved, time.monotonic(), hedge)
+                return True
+            return False
+
+        try:
+            await launch(hedge=False)
+            while pending:
+                can_hedge = self.hedging and not hedge_tried and len(pending) == 1 and next_index < len(candidates)
+                timeout = None
+                if can_hedge:
+                    endpoint, _, started, _ = next(iter(pending.values()))
+                    timeout = max(0.0, self.hedge_delay(endpoint, kind) - (time.monotonic() - started))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_tried = True
+                    hedged = await launch(hedge=True)
+                    continue
+
+                for task in done:
+                    endpoint, reserved, started, is_hedge = pending.pop(task)
+                    try:
+                        response_data = task.result()
+                    except Exception as e:
+                        last_error = e
+                        self._record_failure(endpoint, e, failing_over=bool(pending) or next_index < len(candidates))
+                        continue
+                    self._record_success(endpoint, kind, time.monotonic() - started)
+                    await self._settle_async(endpoint, reserved, response_data.get("usage"))
+                    if hedged:
+                        LLM_HEDGES.inc(winner="hedge" if is_hedge else "primary")
+                    return response_data
+
+                if not pending:
+                    await launch(hedge=False)
+            raise last_error or RuntimeError("No LLM endpoint available")
+        finally:
+            for task, (endpoint, _, started, _) in pending.items():
+                task.cancel()
+                # The abandoned call was at least this slow; let that count against it in ranking
+                endpoint.record_slowness(kind, time.monotonic() - started)
+
+    async def stream_completion(self, body: bytes, client_for: Callable[[str], Any], usage: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Yield content deltas from a streamed completion, failing over until the stream starts
+
+        Token usage from the closing chunk, if the endpoint sends one, is copied into `usage`.
+        """
+        async for delta in self.stream_deltas(body, client_for, usage):
+            content = delta.get("content")
+            if content:
+                yield content
+
+    async def stream_deltas(self, body: bytes, client_for: Callable[[str], Any], usage: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the raw deltas (content and tool call fragments) of a streamed completion, failing over until the stream starts"""
+        usage = {} if usage is None else usage
+        candidates = self.ranked("stream")
+        for position, endpoint in enumerate(candidates):
+            last = position == len(candidates) - 1
+            reserved = None
+            try:
+                if endpoint.rate_limiter is not None:
+                    reserved = await endpoint.rate_limiter.acquire_async(body)
+                started = time.monotonic()
+                with span("groq_stream_start"):
+                    response = await request_with_retry_async(
+                        client_for(endpoint.upstream), "POST", endpoint.url, stream=True,
+                        max_retries=self._retries(position, candidates), headers=endpoint.headers, content=endpoint.body(body)
+                    )
+                GROQ_REQUESTS.inc(endpoint=endpoint.name, status=response.status_code)
+                if response.status_code != 200:
+                    try:
+                        await response.aread()
+                        self._check_response(endpoint, response)
+                    finally:
+                        await response.aclose()
+            except Exception as e:
+                self._record_failure(endpoint, e, failing_over=not last)
+                if last:
+                    raise
+                continue
+            break
+
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                chunk_usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage")
+                if chunk_usage:
+                    usage.update(chunk_usage)
+                choices = chunk.get("choices") or []
+                delta = choices[0].get("delta") if choices else None
+                if delta:
+                    yield delta
+            self._record_success(endpoint, "stream", time.monotonic() - started)
+        finally:
+            await response.aclose()
+            await self._settle_async(endpoint, reserved, usage)
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_llm_router() -> LLMRouter:
+    """Process-wide router, so every agent instance shares the endpoint latency history"""
+    global _router
+    if _router is None:
+        _router = LLMRouter(endpoints_from_config())
+    return _router
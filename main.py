@@ -1,118 +1,546 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List
+from sqlalchemy import select, func, or_, and_, text, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-import uvicorn
+from contextlib import asynccontextmanager
+import base64
+import binascii
+import hashlib
+import json
+import time
 
-from database import get_db, create_tables, Plan
-from agent import TaskPlanningAgent
+from database import get_async_db, create_tables, is_sqlite, Plan, PlanJob, AsyncSessionLocal, async_engine
+from cache import LRUCache, get_tool_cache
+from rate_limiter import get_rate_limiter
+from plan_cache import PlanCache, normalize_goal
+from search import search_plans
+from jobs import JobQueue, QueueFullError, fail_interrupted_jobs
+from batch import BatchPlanner, parse_goals
+from compression import CompressionMiddleware
+from single_flight import SingleFlight
+from cache_warmer import CacheWarmer
+from metrics import REGISTRY, Gauge, HTTP_REQUESTS, HTTP_LATENCY, PLANS, RESPONSE_CACHE, span, start_request_spans, server_timing
 from config import Config
 
-# Create tables
-create_tables()
+# The agent (httpx, requests and the tool thread pool) and the Jinja2 templates are
+# built on first use rather than at import, to keep cold starts short
+_agent = None
+_templates = None
 
-app = FastAPI(title="AI Task Planning Agent (Groq + Llama 3.1 8B Instant)", version="1.0.0")
+def get_agent():
+    global _agent
+    if _agent is None:
+        from agent import TaskPlanningAgent
+        _agent = TaskPlanningAgent(debug_mode=Config.DEBUG_MODE)
+    return _agent
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+def get_templates():
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory="templates")
+    return _templates
+
+plan_cache = PlanCache()
+# Concurrent requests for the same goal share one generation
+plan_flights = SingleFlight(enabled=Config.PLAN_COALESCING_ENABLED)
+
+# Serialised plan and plan-list responses; plans never change once written, and every
+# insert in this process drops whatever it could make stale
+plan_response_cache = LRUCache(Config.PLAN_RESPONSE_CACHE_SIZE)
+plan_list_cache = LRUCache(Config.PLAN_RESPONSE_CACHE_SIZE)
+
+@event.listens_for(Plan, "after_insert")
+def forget_cached_responses(mapper, connection, plan):
+    plan_response_cache.pop(str(plan.id))
+    plan_list_cache.clear()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and start job workers and the cache warmer; on shutdown drain jobs and release upstream connections"""
+    # Schema, and jobs a previous process left unfinished; the production launcher does both once before forking workers
+    if not Config.SCHEMA_READY:
+        create_tables()
+        fail_interrupted_jobs()
+    job_queue.start()
+    if Config.CACHE_WARMER_ENABLED:
+        cache_warmer.start()
+    yield
+    await cache_warmer.stop()
+    await job_queue.stop()
+    if _agent is not None:
+        await _agent.aclose()
+
+app = FastAPI(title="AI Task Planning Agent (Groq + Llama 3.1 8B Instant)", version="1.0.0", lifespan=lifespan)
 
 # Static files
-from fastapi.staticfiles import StaticFiles
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize agent
-agent = TaskPlanningAgent(debug_mode=Config.DEBUG_MODE)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time every request, optionally reporting plan spans in a Server-Timing header"""
+    spans = start_request_spans()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    # Label by route template so /api/plans/1 and /api/plans/2 share a series
+    route = getattr(request.scope.get("route"), "path", "other")
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    HTTP_LATENCY.observe(elapsed, method=request.method, route=route)
+    if Config.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
+
+# gzip (or brotli, when installed) for JSON and HTML; added last so it wraps the metrics middleware
+if Config.RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
 
 # Pydantic models
 class GoalRequest(BaseModel):
     goal: str
+    bypass_cache: bool = False
+    # Optional per-request agent limits; unset fields fall back to Config
+    max_rounds: Optional[int] = Field(default=None, ge=1, le=10)
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    token_budget: Optional[int] = Field(default=None, ge=0)
+
+    def limits(self) -> Dict[str, Any]:
+        return {
+            "max_rounds": self.max_rounds,
+            "deadline_seconds": self.deadline_seconds,
+            "token_budget": self.token_budget
+        }
 
 class PlanResponse(BaseModel):
     id: int
     goal: str
     plan_content: str
     created_at: str
+    cached: bool = False
+
+class JobResponse(BaseModel):
+    id: str
+    goal: str
+    status: str
+    plan: Optional[PlanResponse] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class PlanSummary(BaseModel):
+    id: int
+    goal: str
+    preview: str
+    truncated: bool
+    created_at: str
+
+class PlanPage(BaseModel):
+    items: List[PlanSummary]
+    next_cursor: Optional[str] = None
+
+class PlanSearchResult(BaseModel):
+    id: int
+    goal: str
+    goal_html: str
+    snippet_html: str
+    rank: float
+    created_at: str
+
+class PlanSearchPage(BaseModel):
+    items: List[PlanSearchResult]
+    next_offset: Optional[int] = None
+
+def to_plan_response(plan: Plan, cached: bool = False) -> PlanResponse:
+    with span("serialize"):
+        return PlanResponse(
+            id=plan.id,
+            goal=plan.goal,
+            plan_content=plan.plan_content,
+            created_at=plan.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            cached=cached
+        )
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check, using the weak comparison RFC 9110 prescribes for it"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    strip_weak = lambda tag: tag.strip().removeprefix("W/")
+    return strip_weak(etag) in {strip_weak(tag) for tag in if_none_match.split(",")}
+
+def not_modified(request: Request, headers: Dict[str, str], route: str) -> Optional[Response]:
+    """304 Not Modified when the client already holds the response with this ETag"""
+    if not etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return None
+    RESPONSE_CACHE.inc(route=route, result="not_modified")
+    return Response(status_code=304, headers=headers)
+
+def encode_cursor(created_at: datetime, plan_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{plan_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, plan_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(plan_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def save_plan(db: AsyncSession, goal: str, result: Dict[str, Any]) -> Plan:
+    """Persist an agent result and index it in the plan cache when it succeeded"""
+    db_plan = Plan(
+        goal=result["goal"],
+        plan_content=result["plan"]
+    )
+    with span("db_commit"):
+        db.add(db_plan)
+        await db.flush()
+        if result["status"] == "success":
+            plan_cache.record(db, goal, db_plan)
+        await db.commit()
+    return db_plan
+
+async def find_cached_plan(goal: str) -> Optional[Plan]:
+    """Fresh stored plan for the goal, looked up in a session of its own
+
+    The session is closed before the caller goes on to wait for the LLM, so
+    no request keeps a pooled connection checked out while a plan generates.
+    """
+    async with AsyncSessionLocal() as db:
+        return await plan_cache.lookup(db, goal)
+
+async def generate_plan(goal: str, bypass_cache: bool = False, **limits) -> Tuple[Plan, str]:
+    """Return a stored plan for the goal and how it was produced ("cached", "success" or "error")"""
+    # Serve repeated goals from a fresh stored plan
+    if Config.PLAN_CACHE_ENABLED and not bypass_cache:
+        cached_plan = await find_cached_plan(goal)
+        if cached_plan is not None:
+            PLANS.inc(outcome="cached")
+            return cached_plan, "cached"
+
+    # Create the plan, or wait for an identical one already being generated
+    (db_plan, outcome), joined = await plan_flights.run(flight_key(goal, limits), lambda: generate_and_save(goal, limits))
+    PLANS.inc(outcome="coalesced" if joined else outcome)
+    return db_plan, outcome
+
+def flight_key(goal: str, limits: Dict[str, Any]) -> Tuple:
+    """Requests coalesce when their goals normalise alike and their agent limits match"""
+    return normalize_goal(goal) or goal, tuple(sorted(limits.items()))
+
+async def generate_and_save(goal: str, limits: Dict[str, Any]) -> Tuple[Plan, str]:
+    """Run the agent and store one plan, in a session of its own so it outlives any single caller"""
+    result = await get_agent().create_plan_async(goal, **limits)
+    async with AsyncSessionLocal() as db:
+        return await save_plan(db, goal, result), result["status"]
+
+async def run_plan_job(goal: str, bypass_cache: bool) -> Tuple[Plan, bool]:
+    plan, outcome = await generate_plan(goal, bypass_cache)
+    return plan, outcome != "error"
+
+job_queue = JobQueue(run_plan_job)
+
+async def warm_plan(goal: str, token_budget: int) -> Tuple[Optional[Plan], int]:
+    """Pre-generate a plan for the cache warmer; failed generations are not stored"""
+    result = await get_agent().create_plan_async(goal, token_budget=token_budget)
+    tokens = result["usage"]["total_tokens"]
+    if result["status"] != "success":
+        return None, tokens
+    async with AsyncSessionLocal() as db:
+        return await save_plan(db, goal, result), tokens
+
+cache_warmer = CacheWarmer(get_agent, warm_plan, get_tool_cache(), plan_cache)
+
+REGISTRY.register(Gauge("job_queue_depth", "Plan jobs waiting in this process's queue", lambda: job_queue.depth))
+REGISTRY.register(Gauge("tool_cache_hit_ratio", "Share of tool calls answered from the tool cache", lambda: get_tool_cache().stats()["hit_rate"]))
+REGISTRY.register(Gauge("groq_rate_limit_waiting", "Groq calls queued behind the rate limiter in this process", lambda: get_rate_limiter().waiting))
+REGISTRY.register(Gauge("plan_cache_hit_ratio", "Share of plan cache lookups that found a plan", lambda: plan_cache.stats()["hit_rate"]))
+REGISTRY.register(Gauge("plan_generations_in_flight", "Distinct plan generations running in this process", lambda: plan_flights.in_flight))
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 # Routes
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Main page with goal input form"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 @app.post("/api/plan", response_model=PlanResponse)
-async def create_plan(goal_request: GoalRequest, db: Session = Depends(get_db)):
+async def create_plan(goal_request: GoalRequest):
     """Create a new plan from a goal"""
     try:
-        # Create plan using agent
-        result = agent.create_plan(goal_request.goal)
-        
-        # Save to database
-        db_plan = Plan(
-            goal=result["goal"],
-            plan_content=result["plan"]
-        )
-        db.add(db_plan)
-        db.commit()
-        db.refresh(db_plan)
-        
-        return PlanResponse(
-            id=db_plan.id,
-            goal=db_plan.goal,
-            plan_content=db_plan.plan_content,
-            created_at=db_plan.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        )
+        db_plan, outcome = await generate_plan(goal_request.goal, goal_request.bypass_cache, **goal_request.limits())
+        return to_plan_response(db_plan, cached=outcome == "cached")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/plans", response_model=List[PlanResponse])
-async def get_plans(db: Session = Depends(get_db)):
-    """Get all plans"""
-    plans = db.query(Plan).order_by(Plan.created_at.desc()).all()
-    return [
-        PlanResponse(
-            id=plan.id,
-            goal=plan.goal,
-            plan_content=plan.plan_content,
-            created_at=plan.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        for plan in plans
-    ]
+@app.post("/api/plan/stream")
+async def stream_plan(goal_request: GoalRequest):
+    """Create a new plan, streaming tool progress and plan tokens as Server-Sent Events"""
+    async def event_stream():
+        try:
+            if Config.PLAN_CACHE_ENABLED and not goal_request.bypass_cache:
+                cached_plan = await find_cached_plan(goal_request.goal)
+                if cached_plan is not None:
+                    PLANS.inc(outcome="cached")
+                    yield sse_event("token", {"content": cached_plan.plan_content})
+                    yield sse_event("plan", to_plan_response(cached_plan, cached=True).model_dump())
+                    return
+
+            # Someone is already generating this plan; wait for it instead of starting another
+            shared = plan_flights.join(flight_key(goal_request.goal, goal_request.limits()))
+            if shared is not None:
+                db_plan, outcome = await shared
+                PLANS.inc(outcome="coalesced")
+                yield sse_event("token", {"content": db_plan.plan_content})
+                if outcome == "error":
+                    yield sse_event("error", {"detail": db_plan.plan_content})
+                yield sse_event("plan", to_plan_response(db_plan).model_dump())
+                return
+
+            async for event in get_agent().stream_plan(goal_request.goal, **goal_request.limits()):
+                if event["event"] != "done":
+                    yield sse_event(event["event"], event["data"])
+                    continue
+
+                # Persist the assembled plan once the stream has finished; the session
+                # exists only for the insert, not for the length of the stream
+                result = event["data"]
+                async with AsyncSessionLocal() as db:
+                    db_plan = await save_plan(db, goal_request.goal, result)
+                PLANS.inc(outcome=result["status"])
+                if result["status"] == "error":
+                    yield sse_event("error", {"detail": result["plan"]})
+                yield sse_event("stats", {
+                    "stop_reason": result.get("stop_reason"),
+                    "rounds": result.get("rounds", []),
+                    "usage": result.get("usage", {}),
+                    "context_tokens_saved": result.get("context_tokens_saved", 0),
+                    "elapsed_ms": result.get("elapsed_ms")
+                })
+                yield sse_event("plan", to_plan_response(db_plan).model_dump())
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/jobs", status_code=202)
+async def create_plan_job(goal_request: GoalRequest, db: AsyncSession = Depends(get_async_db)):
+    """Queue plan generation in the background; poll the returned status_url for the result"""
+    try:
+        job = await job_queue.submit(db, goal_request.goal, goal_request.bypass_cache)
+    except QueueFullError as e:
+        return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": "5"})
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}"
+    }
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_plan_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get the status of a background plan job, with the plan once it has finished"""
+    job = await db.get(PlanJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    plan = await db.get(Plan, job.plan_id) if job.plan_id else None
+    return JobResponse(
+        id=job.id,
+        goal=job.goal,
+        status=job.status,
+        plan=to_plan_response(plan) if plan else None,
+        error=job.error,
+        created_at=format_timestamp(job.created_at),
+        started_at=format_timestamp(job.started_at),
+        finished_at=format_timestamp(job.finished_at)
+    )
+
+@app.post("/api/plans/batch")
+async def create_plan_batch(
+    request: Request,
+    concurrency: int = Query(Config.BATCH_CONCURRENCY, ge=1, le=64),
+    bypass_cache: bool = False
+):
+    """Plan every goal in a JSONL request body, streaming one NDJSON result per line
+
+    Identical goals are planned once; results are committed in bulk before they are sent.
+    """
+    items = parse_goals((await request.body()).splitlines())
+    if len(items) > Config.BATCH_MAX_GOALS:
+        raise HTTPException(status_code=413, detail=f"At most {Config.BATCH_MAX_GOALS} goals per batch")
+
+    planner = BatchPlanner(get_agent(), plan_cache, concurrency)
+
+    async def result_stream():
+        async with AsyncSessionLocal() as db:
+            async for line in planner.run(db, items, bypass_cache):
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.get("/api/plans", response_model=PlanPage)
+async def get_plans(
+    request: Request,
+    limit: int = Query(Config.PLANS_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of plan summaries, newest first
+
+    Pass the returned next_cursor back as `cursor` to fetch the following page.
+    Pages only change when a plan is added, so the ETag is keyed on the newest
+    plan id and clients revalidate with If-None-Match.
+    """
+    latest_id = (await db.execute(select(func.max(Plan.id)))).scalar() or 0
+    etag = f'"plans-{latest_id}-{limit}-{cursor or ""}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    response = not_modified(request, headers, "/api/plans")
+    if response is not None:
+        return response
+
+    body = plan_list_cache.get(etag)
+    if body is None:
+        RESPONSE_CACHE.inc(route="/api/plans", result="miss")
+        body = (await load_plan_page(db, limit, cursor)).model_dump_json().encode()
+        plan_list_cache.set(etag, body)
+    else:
+        RESPONSE_CACHE.inc(route="/api/plans", result="hit")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def load_plan_page(db: AsyncSession, limit: int, cursor: Optional[str]) -> PlanPage:
+    # Served from the stored preview columns; plan_content is compressed and never read here
+    preview = func.substr(func.coalesce(Plan.preview, ""), 1, Config.PLAN_PREVIEW_CHARS)
+    query = select(
+        Plan.id,
+        Plan.goal,
+        preview.label("preview"),
+        (func.coalesce(Plan.content_chars, 0) > func.length(preview)).label("truncated"),
+        Plan.created_at
+    )
+    if cursor:
+        created_at, plan_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Plan.created_at < created_at,
+            and_(Plan.created_at == created_at, Plan.id < plan_id)
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.execute(query.order_by(Plan.created_at.desc(), Plan.id.desc()).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return PlanPage(
+        items=[
+            PlanSummary(
+                id=row.id,
+                goal=row.goal,
+                preview=row.preview,
+                truncated=bool(row.truncated),
+                created_at=row.created_at.strftime("%Y-%m-%d %H:%M:%S")
+            )
+            for row in rows
+        ],
+        next_cursor=encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    )
+
+@app.get("/api/plans/search", response_model=PlanSearchPage)
+async def search_plan_history(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(Config.PLANS_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over plan goals and content, best matches first"""
+    if not is_sqlite(Config.DATABASE_URL):
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite FTS5")
+
+    # Fetch one extra row to know whether another page exists
+    matches = await search_plans(db, q, limit=limit + 1, offset=offset)
+    has_more = len(matches) > limit
+
+    return PlanSearchPage(
+        items=[
+            PlanSearchResult(
+                **{**match, "created_at": match["created_at"].strftime("%Y-%m-%d %H:%M:%S")}
+            )
+            for match in matches[:limit]
+        ],
+        next_offset=offset + limit if has_more else None
+    )
 
 @app.get("/api/plans/{plan_id}", response_model=PlanResponse)
-async def get_plan(plan_id: int, db: Session = Depends(get_db)):
+async def get_plan(plan_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get a specific plan by ID"""
-    plan = db.query(Plan).filter(Plan.id == plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Plan not found")
-    
-    return PlanResponse(
-        id=plan.id,
-        goal=plan.goal,
-        plan_content=plan.plan_content,
-        created_at=plan.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    )
+    route = "/api/plans/{plan_id}"
+    entry = plan_response_cache.get(str(plan_id))
+    if entry is None:
+        plan = await db.get(Plan, plan_id)
+        if not plan:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        body = to_plan_response(plan).model_dump_json().encode()
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        plan_response_cache.set(str(plan_id), entry)
+        RESPONSE_CACHE.inc(route=route, result="miss")
+    else:
+        RESPONSE_CACHE.inc(route=route, result="hit")
+
+    body, etag = entry
+    # Plans are immutable, so browsers and CDNs may keep them without revalidating
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={Config.PLAN_HTTP_MAX_AGE}, immutable"}
+    return not_modified(request, headers, route) or Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/history", response_class=HTMLResponse)
 async def history_page(request: Request):
     """History page showing all plans"""
-    return templates.TemplateResponse("history.html", {"request": request})
+    return get_templates().TemplateResponse("history.html", {"request": request})
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        database = "connected"
+    except Exception as e:
+        database = f"unavailable: {e}"
+
     return {
-        "status": "healthy",
+        "status": "healthy" if database == "connected" else "degraded",
         "model": Config.GROQ_MODEL,
-        "database": "connected",
+        "database": database,
         "debug_mode": Config.DEBUG_MODE,
+        "tool_cache": get_tool_cache().stats(),
+        "plan_cache": plan_cache.stats(),
+        "job_queue_depth": job_queue.depth,
+        "cache_warmer": cache_warmer.stats(),
+        # Endpoint latencies exist once the agent has been used
+        "llm_endpoints": _agent.router.stats() if _agent is not None else [],
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, span, token and cache metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/debug")
 async def toggle_debug_mode():
     """Toggle debug mode (development only)"""
@@ -120,13 +548,17 @@ async def toggle_debug_mode():
         return {"message": "Debug mode is disabled. Set DEBUG_MODE=true in .env to enable."}
     
     # Reinitialize agent with toggled debug mode
-    global agent
-    agent = TaskPlanningAgent(debug_mode=not agent.debug_mode)
+    global _agent
+    from agent import TaskPlanningAgent
+    current = get_agent()
+    await current.aclose()
+    _agent = TaskPlanningAgent(debug_mode=not current.debug_mode)
     
     return {
-        "debug_mode": agent.debug_mode,
-        "message": f"Debug mode {'enabled' if agent.debug_mode else 'disabled'}"
+        "debug_mode": _agent.debug_mode,
+        "message": f"Debug mode {'enabled' if _agent.debug_mode else 'disabled'}"
     }
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
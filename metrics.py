@@ -0,0 +1,231 @@
+"""
+In-process metrics rendered in the Prometheus text format, plus request-scoped timing spans
+
+Metrics are per process; with several workers, scrape each one or sum them
+in Prometheus.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from fast DB queries up to slow multi-round plans
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value read from a callback when metrics are rendered"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route and status", ("method", "route", "status")
+))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to the start of the HTTP response, by route", ("method", "route")
+))
+SPAN_LATENCY = REGISTRY.register(Histogram(
+    "plan_span_duration_seconds", "Time spent in each step of plan generation", ("span",)
+))
+GROQ_REQUESTS = REGISTRY.register(Counter(
+    "groq_requests_total", "Chat completion calls, by LLM endpoint and HTTP status", ("endpoint", "status")
+))
+LLM_LATENCY = REGISTRY.register(Histogram(
+    "llm_request_duration_seconds", "Successful chat completion latency, by LLM endpoint and request kind", ("endpoint", "kind")
+))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "llm_hedged_requests_total", "Hedged chat completions, by which copy answered first (primary or hedge)", ("winner",)
+))
+LLM_FAILOVERS = REGISTRY.register(Counter(
+    "llm_failovers_total", "Chat completions moved to another endpoint after an error, by failed endpoint", ("endpoint",)
+))
+GROQ_TOKENS = REGISTRY.register(Counter(
+    "groq_tokens_total", "Tokens reported in Groq usage, by kind", ("kind",)
+))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "tool_calls_total", "Tool calls made by the agent, by tool", ("tool",)
+))
+PLANS = REGISTRY.register(Counter(
+    "plans_total", "Plans served, by outcome (success, error, cached, coalesced)", ("outcome",)
+))
+SINGLE_FLIGHT = REGISTRY.register(Counter(
+    "plan_coalescing_total", "Plan generations started (leader) or joined while already in flight (follower)", ("role",)
+))
+RESPONSE_CACHE = REGISTRY.register(Counter(
+    "plan_response_cache_total", "Plan reads answered from serialised bytes (hit), rebuilt (miss) or with 304 (not_modified)", ("route", "result")
+))
+WARMER_ITEMS = REGISTRY.register(Counter(
+    "cache_warmer_items_total", "Work done by the cache warmer: tool results refreshed, plans pre-generated, tokens spent", ("kind",)
+))
+WARMED_HITS = REGISTRY.register(Counter(
+    "cache_warmer_hits_total", "Requests answered from a tool result or plan the cache warmer prepared, by cache", ("cache",)
+))
+CONTEXT_TOKENS_SAVED = REGISTRY.register(Counter(
+    "context_tokens_saved_total", "Estimated prompt tokens removed by trimming tool results"
+))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "groq_rate_limit_wait_seconds", "Time Groq calls spent queued behind the client-side rate limiter",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+))
+
+
+# Spans recorded while handling the current request, for the Server-Timing header
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block into the span histogram and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_LATENCY.observe(elapsed, span=name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def start_request_spans() -> List[Tuple[str, float]]:
+    """Begin collecting spans for the current request; child tasks share the list"""
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value, summing repeated spans of the same name"""
+    totals: Dict[str, Tuple[float, int]] = {}
+    for name, elapsed in spans:
+        duration, count = totals.get(name, (0.0, 0))
+        totals[name] = (duration + elapsed, count + 1)
+    entries = []
+    for name, (duration, count) in totals.items():
+        description = f';desc="{count}x"' if count > 1 else ""
+        entries.append(f"{name};dur={duration * 1000:.1f}{description}")
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def record_usage(usage: Optional[Dict[str, int]]):
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            GROQ_TOKENS.inc(usage[kind], kind=kind.replace("_tokens", ""))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq, DuckDuckGo and OpenWeather APIs, for offline benchmarks
+
+    python mock_upstreams.py --port 9100 --latency-ms 300 --jitter-ms 100 --error-rate 0.01
+
+Point the agent at it with:
+    GROQ_BASE_URL=http://127.0.0.1:9100/openai/v1
+    SEARCH_API_URL=http://127.0.0.1:9100/duckduckgo/
+    WEATHER_API_URL=http://127.0.0.1:9100/weather
+
+The first completion of a conversation asks for one web_search and one
+get_weather call derived from the goal; once tool results are present the
+completion returns a canned plan, streamed when the request asks for it.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PLAN_TEMPLATE = """## Plan: {goal}
+
+### Day 1
+- 09:00 Breakfast near the city centre
+- 10:30 Guided walking tour of the old town
+- 13:00 Lunch at a well-reviewed local restaurant
+- 15:00 Museum visit (book tickets online in advance)
+- 19:30 Dinner and an evening stroll
+
+### Day 2
+- 08:30 Early start to beat the crowds at the main landmark
+- 12:00 Market visit and street food
+- 16:00 Park or waterfront, depending on the weather
+- 20:00 Farewell dinner
+
+### Practical notes
+- Budget roughly $80-120 per day excluding accommodation
+- Carry a light rain jacket
+"""
+
+CITIES = ["Paris", "Tokyo", "Hyderabad", "Goa", "Shimla", "Delhi", "Jaipur", "Manali", "Rome", "Lisbon"]
+
+
+def _location(goal: str) -> str:
+    for city in CITIES:
+        if city.lower() in goal.lower():
+            return city
+    words = re.findall(r"[A-Z][a-z]+", goal)
+    return words[-1] if words else "London"
+
+
+def _usage(messages: List[Dict[str, Any]], completion_tokens: int) -> Dict[str, int]:
+    # Roughly four characters per token, like the real tokenizer on English text
+    prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, tool_latency_ms: float = None,
+               tail_rate: float = 0.0, tail_ms: float = 0.0) -> FastAPI:
+    """Build the mock upstream app with the given simulated latency and failure rate
+
+    A `tail_rate` fraction of completions takes an extra `tail_ms`, to model
+    the slow outliers that hedged requests are meant to cut.
+    """
+    app = FastAPI(title="Mock upstreams")
+    tool_latency_ms = latency_ms / 4 if tool_latency_ms is None else tool_latency_ms
+    counters = {"groq": 0, "search": 0, "weather": 0, "errors": 0}
+
+    async def delay(base_ms: float):
+        seconds = max(0.0, base_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def failure():
+        if error_rate and random.random() < error_rate:
+            counters["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": "simulated upstream failure"}, headers={"Retry-After": "0"})
+        return None
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        counters["groq"] += 1
+        body = await request.json()
+        slow = tail_rate and random.random() < tail_rate
+        await delay(latency_ms + (tail_ms if slow else 0))
+        error = failure()
+        if error is not None:
+            return error
+
+        messages = body.get("messages", [])
+        goal = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        goal = goal.replace("Create a detailed plan for this goal: ", "")
+        has_tool_results = any(m.get("role") == "tool" for m in messages)
+
+        if body.get("tools") and not has_tool_results:
+            tool_calls = [
+                {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function", "function": {
+                    "name": "web_search", "arguments": json.dumps({"query": f"top things to do {_location(goal)}"})
+                }},
+                {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function", "function": {
+                    "name": "get_weather", "arguments": json.dumps({"location": _location(goal)})
+                }}
+            ]
+            if body.get("stream"):
+                async def tool_chunks():
+                    # Like Groq: the id and name first, then the arguments in pieces
+                    for index, call in enumerate(tool_calls):
+                        head = {"index": index, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}
+                        yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'tool_calls': [head]}}]})}\n\n"
+                        arguments = call["function"]["arguments"]
+                        for start in range(0, len(arguments), 8):
+                            piece = {"index": index, "function": {"arguments": arguments[start:start + 8]}}
+                            yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'tool_calls': [piece]}}]})}\n\n"
+                    yield f"data: {json.dumps({'choices': [], 'x_groq': {'usage': _usage(messages, 40)}})}\n\n"
+                    yield "data: [DONE]\n\n"
+
+                return StreamingResponse(tool_chunks(), media_type="text/event-stream")
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            return {"id": uuid.uuid4().hex, "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls"}],
+                    "usage": _usage(messages, 40)}
+
+        plan = PLAN_TEMPLATE.format(goal=goal)
+        usage = _usage(messages, len(plan) // 4)
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": plan}
+            return {"id": uuid.uuid4().hex, "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    "usage": usage}
+
+        async def chunks():
+            for line in plan.splitlines(keepends=True):
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': line}}]})}\n\n"
+            yield f"data: {json.dumps({'choices': [], 'x_groq': {'usage': usage}})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/duckduckgo/")
+    async def duckduckgo(q: str = ""):
+        counters["search"] += 1
+        await delay(tool_latency_ms)
+        error = failure()
+        if error is not None:
+            return error
+        return {
+            "Abstract": f"{q.title()} is a popular destination with plenty to see.",
+            "RelatedTopics": [{"Text": f"{q} - highlight {i}"} for i in range(1, 6)],
+            "Answer": ""
+        }
+
+    @app.get("/weather")
+    async def weather(q: str = ""):
+        counters["weather"] += 1
+        await delay(tool_latency_ms)
+        error = failure()
+        if error is not None:
+            return error
+        return {
+            "name": q or "London",
+            "sys": {"country": "XX"},
+            "main": {"temp": 24.5, "humidity": 60},
+            "weather": [{"description": "scattered clouds"}],
+            "wind": {"speed": 3.2}
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "time": time.time()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock Groq, DuckDuckGo and OpenWeather APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean Groq response latency")
+    parser.add_argument("--tool-latency-ms", type=float, default=None, help="Mean search/weather latency (default: a quarter of --latency-ms)")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform +/- jitter added to every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of completions that are slow outliers")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="Extra latency of a slow outlier")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.tool_latency_ms, args.tail_rate, args.tail_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
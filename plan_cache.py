@@ -0,0 +1,173 @@
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import Plan, PlanCacheEntry
+from metrics import WARMED_HITS
+
+
+def normalize_goal(goal: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a goal"""
+    return " ".join(re.findall(r"[a-z0-9]+", (goal or "").lower()))
+
+
+def goal_shingles(normalized_goal: str) -> Set[str]:
+    """Word unigrams plus bigrams, so word order carries some weight"""
+    tokens = normalized_goal.split()
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _numbers(normalized_goal: str) -> Set[str]:
+    return {token for token in normalized_goal.split() if token.isdigit()}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PlanCache:
+    """Finds a fresh stored plan for a goal so repeated goals can skip the LLM
+
+    Exact matches on the normalised goal come straight from the indexed
+    plan_cache table. Near matches use an in-process shingle index that is
+    topped up incrementally from the same table, so entries written by
+    other workers become visible on the next lookup.
+    """
+
+    def __init__(self, ttl_seconds: int = None, similarity: float = None, max_entries: int = None):
+        self.ttl = timedelta(seconds=ttl_seconds if ttl_seconds is not None else Config.PLAN_CACHE_TTL)
+        self.similarity = similarity if similarity is not None else Config.PLAN_CACHE_SIMILARITY
+        self.max_entries = max_entries or Config.PLAN_CACHE_INDEX_SIZE
+        # entry id -> (plan id, shingles, numbers, created_at)
+        self._entries: Dict[int, Tuple[int, Set[str], Set[str], datetime]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._last_entry_id = 0
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.warmed_hits = 0
+        # Plans pre-generated by the cache warmer; hits on them are counted as warmed hits
+        self.warmed_plan_ids: Set[int] = set()
+
+    async def lookup(self, db: AsyncSession, goal: str) -> Optional[Plan]:
+        """Return a fresh cached plan for the goal, or None"""
+        normalized = normalize_goal(goal)
+        if not normalized:
+            return None
+        cutoff = datetime.utcnow() - self.ttl
+
+        plan_id = await db.scalar(
+            select(PlanCacheEntry.plan_id)
+            .where(PlanCacheEntry.normalized_goal == normalized, PlanCacheEntry.created_at >= cutoff)
+            .order_by(PlanCacheEntry.id.desc())
+            .limit(1)
+        )
+        plan = await db.get(Plan, plan_id) if plan_id else None
+        if plan is not None:
+            self._count("exact_hits")
+            self._note_warmed(plan)
+            return plan
+
+        if self.similarity < 1.0:
+            await self._refresh(db, cutoff)
+            plan_id = self._fuzzy_match(normalized, cutoff)
+            plan = await db.get(Plan, plan_id) if plan_id else None
+            if plan is not None:
+                self._count("fuzzy_hits")
+                self._note_warmed(plan)
+                return plan
+
+        self._count("misses")
+        return None
+
+    def record(self, db: AsyncSession, goal: str, plan: Plan):
+        """Index a freshly generated plan; the caller commits"""
+        normalized = normalize_goal(goal)
+        if normalized:
+            db.add(PlanCacheEntry(normalized_goal=normalized, plan_id=plan.id))
+
+    def _fuzzy_match(self, normalized: str, cutoff: datetime) -> Optional[int]:
+        with self._lock:
+            shingles = goal_shingles(normalized)
+            numbers = _numbers(normalized)
+
+            candidates = set()
+            for shingle in shingles:
+                candidates |= self._postings.get(shingle, set())
+
+            best_plan_id, best_score = None, 0.0
+            for entry_id in candidates:
+                plan_id, entry_shingles, entry_numbers, created_at = self._entries[entry_id]
+                # "3 day trip" and "5 day trip" look alike but are different plans
+                if created_at < cutoff or entry_numbers != numbers:
+                    continue
+                score = jaccard(shingles, entry_shingles)
+                if score > best_score:
+                    best_plan_id, best_score = plan_id, score
+
+            return best_plan_id if best_score >= self.similarity else None
+
+    async def _refresh(self, db: AsyncSession, cutoff: datetime):
+        """Pull entries added since the last refresh and drop stale ones"""
+        rows = (await db.execute(
+            select(PlanCacheEntry.id, PlanCacheEntry.plan_id, PlanCacheEntry.normalized_goal, PlanCacheEntry.created_at)
+            .where(PlanCacheEntry.id > self._last_entry_id, PlanCacheEntry.created_at >= cutoff)
+            .order_by(PlanCacheEntry.id)
+        )).all()
+        with self._lock:
+            self._apply(rows, cutoff)
+
+    def _apply(self, rows, cutoff: datetime):
+        for row in rows:
+            shingles = goal_shingles(row.normalized_goal)
+            self._entries[row.id] = (row.plan_id, shingles, _numbers(row.normalized_goal), row.created_at)
+            for shingle in shingles:
+                self._postings.setdefault(shingle, set()).add(row.id)
+            self._last_entry_id = max(self._last_entry_id, row.id)
+
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry[3] < cutoff]
+        live = sorted(entry_id for entry_id, entry in self._entries.items() if entry[3] >= cutoff)
+        overflow = len(live) - self.max_entries
+        if overflow > 0:
+            # Keep the newest entries when the index is full
+            stale.extend(live[:overflow])
+        for entry_id in stale:
+            _, shingles, _, _ = self._entries.pop(entry_id)
+            for shingle in shingles:
+                postings = self._postings.get(shingle)
+                if postings is not None:
+                    postings.discard(entry_id)
+                    if not postings:
+                        del self._postings[shingle]
+
+    def mark_warmed(self, plan_ids: Iterable[int]):
+        """Replace the set of plans whose hits count as warmed"""
+        self.warmed_plan_ids = set(plan_ids)
+
+    def _note_warmed(self, plan: Plan):
+        if plan.id in self.warmed_plan_ids:
+            self._count("warmed_hits")
+            WARMED_HITS.inc(cache="plan")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "warmed_hits": self.warmed_hits,
+            "hit_rate": round((self.exact_hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+            "indexed_goals": len(self._entries)
+        }
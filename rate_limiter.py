@@ -0,0 +1,253 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from context_trim import approx_tokens
+from metrics import RATE_LIMIT_WAIT, span
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a Groq call would have to wait longer than GROQ_RATE_LIMIT_MAX_WAIT"""
+
+
+class MemoryBuckets:
+    """Token buckets kept in this process only"""
+
+    def __init__(self):
+        self._state: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def take(self, costs: Dict[str, float], limits: Dict[str, float]) -> float:
+        """Take `costs` from every bucket if all can pay, else return the seconds to wait"""
+        with self._lock:
+            now = time.time()
+            levels = {name: _refill(self._state.get(name), limit, now) for name, limit in limits.items()}
+            wait = _wait_for(levels, costs, limits)
+            if wait == 0:
+                for name in limits:
+                    self._state[name] = (levels[name] - costs.get(name, 0), now)
+            return wait
+
+    def adjust(self, name: str, amount: float, limit: float):
+        with self._lock:
+            now = time.time()
+            self._state[name] = (_refill(self._state.get(name), limit, now) - amount, now)
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file, so every worker process draws from the same budget"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode so BEGIN IMMEDIATE can take the write lock explicitly
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn: sqlite3.Connection, name: str) -> Optional[tuple]:
+        return conn.execute("SELECT level, updated_at FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+
+    def _write(self, conn: sqlite3.Connection, name: str, level: float, now: float):
+        conn.execute("INSERT OR REPLACE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)", (name, level, now))
+
+    def take(self, costs: Dict[str, float], limits: Dict[str, float]) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            levels = {name: _refill(self._read(conn, name), limit, now) for name, limit in limits.items()}
+            wait = _wait_for(levels, costs, limits)
+            if wait == 0:
+                for name in limits:
+                    self._write(conn, name, levels[name] - costs.get(name, 0), now)
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def adjust(self, name: str, amount: float, limit: float):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self._write(conn, name, _refill(self._read(conn, name), limit, now) - amount, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _refill(state: Optional[tuple], per_minute: float, now: float) -> float:
+    """Bucket level at `now`; buckets start full and refill continuously up to one minute's worth"""
+    if state is None:
+        return per_minute
+    level, updated_at = state
+    return min(per_minute, level + (now - updated_at) * per_minute / 60)
+
+
+def _wait_for(levels: Dict[str, float], costs: Dict[str, float], limits: Dict[str, float]) -> float:
+    wait = 0.0
+    for name, per_minute in limits.items():
+        # A single call larger than the whole bucket only needs a full bucket
+        cost = min(costs.get(name, 0), per_minute)
+        shortfall = cost - levels[name]
+        if shortfall > 0:
+            wait = max(wait, shortfall * 60 / per_minute)
+    return wait
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Rough token cost of a serialised chat completion request, plus the expected reply"""
+    return approx_tokens(body) + Config.GROQ_EXPECTED_COMPLETION_TOKENS
+
+
+class GroqRateLimiter:
+    """Client-side requests-per-minute and tokens-per-minute budget for Groq
+
+    Callers reserve one request and an estimated token count before each
+    call and settle the estimate against the reported usage afterwards.
+    When the budget is spent, callers queue in arrival order (one waiter
+    per process polls the shared buckets at a time) instead of failing.
+    """
+
+    def __init__(self, rpm: int = None, tpm: int = None, db_path: Optional[str] = None, max_wait: float = None):
+        rpm = Config.GROQ_RPM if rpm is None else rpm
+        tpm = Config.GROQ_TPM if tpm is None else tpm
+        self.limits = {name: float(limit) for name, limit in (("requests", rpm), ("tokens", tpm)) if limit > 0}
+        self.max_wait = Config.GROQ_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self.buckets = SQLiteBuckets(db_path) if db_path else MemoryBuckets()
+        self._thread_lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.waiting = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.limits)
+
+    def _costs(self, tokens: int) -> Dict[str, float]:
+        return {"requests": 1, "tokens": tokens}
+
+    def _take(self, tokens: int) -> float:
+        try:
+            return self.buckets.take(self._costs(tokens), self.limits)
+        except sqlite3.Error:
+            # A locked or broken shared file should not stop planning
+            return 0.0
+
+    async def _off_loop(self, operation: Callable, *args):
+        """Run a bucket operation from async code
+
+        The shared SQLite buckets can wait up to the connection timeout for
+        another worker's write lock, so they run on a dedicated thread rather
+        than blocking the event loop; in-memory buckets run inline.
+        """
+        if not isinstance(self.buckets, SQLiteBuckets):
+            return operation(*args)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="groq-rate-limit")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, operation, *args)
+
+    def acquire(self, body: bytes) -> int:
+        """Block until the call fits the budget; returns the reserved token estimate"""
+        tokens = estimate_tokens(body)
+        if not self.enabled:
+            return tokens
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            with span("groq_queue"), self._thread_lock:
+                while True:
+                    wait = self._take(tokens)
+                    if wait == 0:
+                        break
+                    self._check_wait(started, wait)
+                    time.sleep(wait)
+        finally:
+            self.waiting -= 1
+            RATE_LIMIT_WAIT.observe(time.monotonic() - started)
+        return tokens
+
+    def try_acquire(self, body: bytes) -> Optional[int]:
+        """Reserve the call only if it fits the budget right now; returns None instead of waiting"""
+        tokens = estimate_tokens(body)
+        if not self.enabled:
+            return tokens
+        return tokens if self._take(tokens) == 0 else None
+
+    async def try_acquire_async(self, body: bytes) -> Optional[int]:
+        """Non-blocking variant of try_acquire"""
+        tokens = estimate_tokens(body)
+        if not self.enabled:
+            return tokens
+        return tokens if await self._off_loop(self._take, tokens) == 0 else None
+
+    async def acquire_async(self, body: bytes) -> int:
+        """Non-blocking variant of acquire"""
+        tokens = estimate_tokens(body)
+        if not self.enabled:
+            return tokens
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps the queue fair
+            with span("groq_queue"):
+                async with self._async_lock:
+                    while True:
+                        wait = await self._off_loop(self._take, tokens)
+                        if wait == 0:
+                            break
+                        self._check_wait(started, wait)
+                        await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+            RATE_LIMIT_WAIT.observe(time.monotonic() - started)
+        return tokens
+
+    def _check_wait(self, started: float, wait: float):
+        if self.max_wait and time.monotonic() - started + wait > self.max_wait:
+            raise RateLimitTimeout(f"Groq rate limit budget exhausted; would wait more than {self.max_wait:g}s")
+
+    def settle(self, estimated_tokens: int, usage: Optional[Dict[str, Any]]):
+        """Correct the token bucket by the difference between the estimate and the reported usage"""
+        if "tokens" not in self.limits or not usage:
+            return
+        actual = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+        if actual:
+            try:
+                self.buckets.adjust("tokens", actual - estimated_tokens, self.limits["tokens"])
+            except sqlite3.Error:
+                pass
+
+    async def settle_async(self, estimated_tokens: int, usage: Optional[Dict[str, Any]]):
+        """Non-blocking variant of settle"""
+        await self._off_loop(self.settle, estimated_tokens, usage)
+
+
+_rate_limiter: Optional[GroqRateLimiter] = None
+
+
+def get_rate_limiter() -> GroqRateLimiter:
+    """Process-wide Groq rate limiter, shared by every agent instance"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = GroqRateLimiter(db_path=Config.GROQ_RATE_LIMIT_DB_PATH or None)
+    return _rate_limiter
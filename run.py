@@ -5,6 +5,8 @@ Powered by Groq + Llama 4 Maverick
 """
 import os
 import sys
+import argparse
+import importlib.util
 import subprocess
 from pathlib import Path
 
@@ -104,18 +106,68 @@ def check_env_vars():
 
 def check_dependencies():
     """Check if required dependencies are installed"""
-    try:
-        import fastapi
-        import uvicorn
-        import sqlalchemy
-        import requests
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+    # find_spec locates the packages without paying for importing them
+    missing = [name for name in ("fastapi", "uvicorn", "sqlalchemy", "httpx", "requests", "aiosqlite")
+               if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
         print("📦 Install dependencies with:")
         print("   pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are installed")
+    return True
+
+def parse_args():
+    """Command line options for choosing development or production mode"""
+    parser = argparse.ArgumentParser(description="Start the AI Task Planning Agent")
+    parser.add_argument("--prod", action="store_true", help="Production mode: several workers, no auto-reload")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes in production mode (default: CPU count)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    return parser.parse_args()
+
+def server_implementations():
+    """Use uvloop and httptools when they are installed, else uvicorn's pure-Python defaults"""
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+def run_production(host, port, workers):
+    """Create the schema once, then fork workers that skip it and drain gracefully on shutdown"""
+    from config import Config
+    from database import create_tables
+    from jobs import fail_interrupted_jobs
+
+    create_tables()
+    interrupted = fail_interrupted_jobs()
+    if interrupted:
+        print(f"ℹ️  Marked {interrupted} jobs left unfinished by the last run as failed")
+    os.environ["SCHEMA_READY"] = "true"
+
+    # Per-process rate-limit buckets would multiply the Groq budget by the worker count
+    if workers > 1 and not os.getenv("GROQ_RATE_LIMIT_DB_PATH"):
+        os.environ["GROQ_RATE_LIMIT_DB_PATH"] = "groq_rate_limit.db"
+        print("ℹ️  Sharing the Groq rate limit across workers via groq_rate_limit.db")
+
+    loop, http = server_implementations()
+    print(f"✅ Production mode: {workers} workers, {loop} event loop, {http} HTTP parser")
+    print(f"📱 Listening on http://{host}:{port}")
+    print("⏹️  Press Ctrl+C (or send SIGTERM) to stop; in-flight plans get "
+          f"{Config.GRACEFUL_SHUTDOWN_TIMEOUT:g}s to finish")
+    print("\n" + "=" * 60)
+
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        log_level="info",
+        access_log=False,
+        timeout_graceful_shutdown=Config.GRACEFUL_SHUTDOWN_TIMEOUT
+    )
 
 def display_startup_info():
     """Display startup information"""
@@ -127,6 +179,7 @@ def display_startup_info():
 
 def main():
     """Main startup function"""
+    args = parse_args()
     display_startup_info()
     
     # Check Python version
@@ -144,24 +197,28 @@ def main():
     if not check_dependencies():
         sys.exit(1)
     
-    # Import and run the application
+    if args.prod:
+        try:
+            run_production(args.host, args.port, args.workers or os.cpu_count() or 1)
+        except Exception as e:
+            print(f"❌ Error starting application: {e}")
+            sys.exit(1)
+        return
+
+    # Run the application; uvicorn imports it, and its startup creates the database tables
     try:
-        from main import app
-        
         print("✅ Configuration validated")
-        print("✅ Database initialized")
-        print("✅ AI Agent ready (Llama 3.1 8B Instant)")
         print("\n🌐 Starting web server...")
-        print("📱 Open your browser to: http://localhost:8000")
-        print("📊 API documentation: http://localhost:8000/docs")
+        print(f"📱 Open your browser to: http://localhost:{args.port}")
+        print(f"📊 API documentation: http://localhost:{args.port}/docs")
         print("⏹️  Press Ctrl+C to stop the server")
         print("\n" + "=" * 60)
         
         import uvicorn
         uvicorn.run(
             "main:app", 
-            host="0.0.0.0", 
-            port=8000, 
+            host=args.host,
+            port=args.port,
             reload=True,
             log_level="info"
         )
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Full-text search over stored plans (SQLite FTS5)
+
+Run directly to (re)build the index for an existing plans.db:
+    python search.py
+"""
+import html
+import re
+from typing import Any, Dict, List
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Control characters mark highlights so the text can be HTML-escaped safely
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+SEARCH_SQL = text(f"""
+    SELECT p.id,
+           p.goal,
+           p.created_at,
+           highlight(plans_fts, 0, '{_MARK_START}', '{_MARK_END}') AS goal_highlight,
+           snippet(plans_fts, 1, '{_MARK_START}', '{_MARK_END}', '…', :snippet_tokens) AS snippet,
+           bm25(plans_fts, 10.0, 1.0) AS rank
+    FROM plans_fts
+    JOIN plans p ON p.id = plans_fts.rowid
+    WHERE plans_fts MATCH :match
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+""").columns(created_at=DateTime)
+
+
+def build_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _to_html(fragment: str) -> str:
+    return html.escape(fragment or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+async def search_plans(db: AsyncSession, query: str, limit: int = 20, offset: int = 0, snippet_tokens: int = 24) -> List[Dict[str, Any]]:
+    """Ranked matches with HTML-safe highlighted goal and snippet"""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    rows = (await db.execute(SEARCH_SQL, {
+        "match": match,
+        "limit": limit,
+        "offset": offset,
+        "snippet_tokens": snippet_tokens
+    })).mappings().all()
+
+    return [
+        {
+            "id": row["id"],
+            "goal": row["goal"],
+            "created_at": row["created_at"],
+            "goal_html": _to_html(row["goal_highlight"]),
+            "snippet_html": _to_html(row["snippet"]),
+            "rank": row["rank"]
+        }
+        for row in rows
+    ]
+
+
+def rebuild_search_index(bind) -> int:
+    """Re-index every stored plan; returns the number of plans indexed"""
+    with bind.begin() as conn:
+        conn.execute(text("DELETE FROM plans_fts"))
+        conn.execute(text(
+            "INSERT INTO plans_fts(rowid, goal, plan_content) SELECT id, goal, plan_text(plan_content) FROM plans"
+        ))
+        conn.execute(text("INSERT INTO plans_fts(plans_fts) VALUES ('optimize')"))
+        return conn.execute(text("SELECT count(*) FROM plans_fts")).scalar()
+
+
+def main():
+    from database import engine, create_search_index
+
+    create_search_index(engine)
+    indexed = rebuild_search_index(engine)
+    print(f"✅ Search index rebuilt: {indexed} plans indexed")
+
+
+if __name__ == "__main__":
+    main()
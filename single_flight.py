@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import SINGLE_FLIGHT
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller starts the work as a task of its own and later callers
+    await that same task, so a caller that goes away (e.g. a client that
+    disconnects) does not cancel the work for the others. Flights are per
+    process; each worker coalesces its own requests.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of the work for `key`, and whether it was shared with an earlier caller"""
+        if not self.enabled:
+            return await work(), False
+        task = self._flights.get(key)
+        joined = task is not None
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(work())
+            task.add_done_callback(lambda done: self._land(key, done))
+        SINGLE_FLIGHT.inc(role="follower" if joined else "leader")
+        return await asyncio.shield(task), joined
+
+    def join(self, key: Hashable) -> Optional[Awaitable[Any]]:
+        """Awaitable result of an in-flight call for `key`, or None if there is none"""
+        task = self._flights.get(key) if self.enabled else None
+        if task is None:
+            return None
+        SINGLE_FLIGHT.inc(role="follower")
+        return asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark the error as retrieved, in case every caller had already gone away
+        if not task.cancelled():
+            task.exception()